@@ -0,0 +1,374 @@
+import argparse
+import json
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+import numpy as np
+from serial_connection import SerialConnection, PROTOCOLS, DEFAULT_SAMPLE_RATE, MAINS_FREQUENCY
+
+# Subscribers connect over TCP ("host:port") or a Unix socket (a path)
+DEFAULT_ADDRESS = "127.0.0.1:8765"
+# Blocks a subscriber may fall behind by before its oldest ones are dropped
+SUBSCRIBER_QUEUE_SIZE = 512
+CONNECT_TIMEOUT = 5
+# How often the accept loop checks whether the server is stopping
+ACCEPT_TIMEOUT = 0.5
+
+# Stream layout: every message is a MESSAGE header (kind, payload length)
+# followed by its payload.
+#   INFO   UTF-8 JSON: sample_rate, mains_frequency, channel names and the
+#          source's session info; sent on connect and whenever the montage
+#          changes
+#   BLOCK  BLOCK_HEADER (first sample number, time of the first sample or NaN,
+#          rows, columns) then rows x columns little-endian float32 samples
+# The sample numbers let a subscriber tell how much it missed when dropped.
+MESSAGE = struct.Struct("<BI")
+BLOCK_HEADER = struct.Struct("<QdII")
+INFO, BLOCK = 1, 2
+
+
+def parse_address(address):
+    """Return (family, address) for "host:port" or a Unix socket path."""
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit() and "/" not in address:
+        return socket.AF_INET, (host, int(port))
+    if not hasattr(socket, "AF_UNIX"):
+        raise ValueError(f"Not a host:port address: {address}")
+    return socket.AF_UNIX, address
+
+
+def _message(kind, payload):
+    return MESSAGE.pack(kind, len(payload)) + payload
+
+
+def _receive(sock, size):
+    """Read exactly ``size`` bytes, or return None once the other end has closed."""
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+class Subscriber:
+    """One connected consumer with its own bounded queue and sender thread.
+
+    ``put`` never blocks: when the queue is full the oldest message is
+    dropped, so a slow consumer loses data instead of stalling the reader.
+    """
+
+    def __init__(self, sock, name, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.socket = sock
+        self.name = name
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self._send, daemon=True)
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+            self.queue.put_nowait(message)
+
+    def _send(self):
+        try:
+            while True:
+                message = self.queue.get()
+                if message is None:
+                    break
+                self.socket.sendall(message)
+        except OSError:
+            # The consumer went away
+            pass
+        finally:
+            self.closed = True
+            self.socket.close()
+
+    def close(self):
+        self.closed = True
+        try:
+            # Unblock a sendall that is waiting on a consumer that stopped reading
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.put(None)
+
+
+class AcquisitionServer:
+    """Runs a connection without Qt and fans its sample blocks out over a socket.
+
+    ``connection`` is any source with the ``SerialConnection`` interface
+    (a serial port, several boards or a replay), already connected. Its
+    reader thread publishes each block once; the encoded message is then
+    queued for every subscriber, and each subscriber's thread sends it.
+    """
+
+    def __init__(self, connection, address=DEFAULT_ADDRESS, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.connection = connection
+        self.address = address
+        self.queue_size = queue_size
+        self.stats = connection.stats
+        self.subscribers = []
+        self.samples_sent = 0
+        self.columns = None
+        self.running = False
+        self._lock = threading.Lock()
+        self._listener = None
+        self._accept_thread = None
+
+    def start(self):
+        family, address = parse_address(self.address)
+        if family != socket.AF_INET and os.path.exists(address):
+            # Left behind by a server that did not shut down cleanly
+            os.unlink(address)
+        self._listener = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(address)
+        self._listener.listen()
+        self._listener.settimeout(ACCEPT_TIMEOUT)
+        self.running = True
+        self._accept_thread = threading.Thread(target=self._accept, daemon=True)
+        self._accept_thread.start()
+        self.connection.start_reading(self.publish)
+
+    def _info(self):
+        connection = self.connection
+        info = {"sample_rate": connection.sample_rate, "mains_frequency": connection.mains_frequency,
+                "channels": list(connection.channel_names), "session": connection.session_info}
+        return _message(INFO, json.dumps(info).encode("utf-8"))
+
+    def _accept(self):
+        while self.running:
+            try:
+                sock, peer = self._listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            sock.settimeout(None)
+            if sock.family == socket.AF_INET:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            subscriber = Subscriber(sock, str(peer or "local"), self.queue_size)
+            with self._lock:
+                subscriber.put(self._info())
+                self.subscribers.append(subscriber)
+            subscriber.thread.start()
+            print(f"Subscriber connected: {subscriber.name}")
+
+    def publish(self, block):
+        """Queue one block for every subscriber; called on the reader thread."""
+        samples = np.ascontiguousarray(block["emg"], dtype="<f4")
+        rows, columns = samples.shape
+        header = BLOCK_HEADER.pack(self.samples_sent, block.get("time", float("nan")), rows, columns)
+        message = _message(BLOCK, header + samples.tobytes())
+        self.samples_sent += rows
+        with self._lock:
+            if columns != self.columns:
+                # The montage changed; tell everyone before the first block of the new width
+                self.columns = columns
+                info = self._info()
+                for subscriber in self.subscribers:
+                    subscriber.put(info)
+            for subscriber in self.subscribers:
+                dropped = subscriber.dropped
+                subscriber.put(message)
+                if subscriber.dropped != dropped:
+                    self.stats.count("dropped_blocks")
+            if any(subscriber.closed for subscriber in self.subscribers):
+                for subscriber in self.subscribers:
+                    if subscriber.closed:
+                        print(f"Subscriber disconnected: {subscriber.name}")
+                self.subscribers = [subscriber for subscriber in self.subscribers if not subscriber.closed]
+            self.stats.set("subscribers", len(self.subscribers))
+
+    def stop(self):
+        self.running = False
+        self.connection.close_connection()
+        if self._accept_thread is not None:
+            self._accept_thread.join()
+            self._accept_thread = None
+        if self._listener is not None:
+            family = self._listener.family
+            self._listener.close()
+            self._listener = None
+            if family != socket.AF_INET and os.path.exists(self.address):
+                os.unlink(self.address)
+        with self._lock:
+            subscribers, self.subscribers = self.subscribers, []
+        # Let queued blocks go out, then end the streams
+        for subscriber in subscribers:
+            subscriber.put(None)
+        for subscriber in subscribers:
+            subscriber.thread.join(timeout=2)
+            if subscriber.thread.is_alive():
+                subscriber.close()
+
+
+class SubscriberConnection(SerialConnection):
+    """Receives the sample stream of an ``AcquisitionServer`` in place of a serial port.
+
+    Blocks go through the usual storage, filtering, metrics, block hand-off
+    and recorder path, so the GUI or any other consumer can run as one of
+    several subscribers. Blocks the server dropped for this subscriber are
+    counted as dropped samples. ``finished`` is set when the server stops.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.socket = None
+        self.address = None
+        self.expected_sample = None
+
+    def connect(self, address=DEFAULT_ADDRESS, protocol=None):
+        try:
+            family, target = parse_address(address)
+            self.socket = socket.socket(family, socket.SOCK_STREAM)
+            self.socket.settimeout(CONNECT_TIMEOUT)
+            self.socket.connect(target)
+            # The server always starts with the stream info
+            kind, payload = self._read_message()
+            if kind != INFO:
+                raise ValueError("Expected the stream info first")
+            self.socket.settimeout(None)
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Error connecting to acquisition server: {e}")
+            if self.socket is not None:
+                self.socket.close()
+                self.socket = None
+            return
+
+        self.address = address
+        # The montage follows the server
+        self.configured_channels = None
+        self.expected_sample = None
+        self.finished = False
+        self._apply_info(payload)
+        self.is_connected = True
+
+    def _read_message(self):
+        header = _receive(self.socket, MESSAGE.size)
+        if header is None:
+            return None, None
+        kind, length = MESSAGE.unpack(header)
+        payload = _receive(self.socket, length)
+        return (kind, payload) if payload is not None else (None, None)
+
+    def _apply_info(self, payload):
+        info = json.loads(payload.decode("utf-8"))
+        self.sample_rate = info["sample_rate"]
+        self.mains_frequency = info.get("mains_frequency", self.mains_frequency)
+        self.session_info = dict(info.get("session") or {}, server=self.address)
+        self.configure_channels(len(info["channels"]))
+        self.channel_names = list(info["channels"])
+        self._update_recorder_names()
+
+    def start_reading(self, update_data=None, block_size=None, block_interval=None):
+        """Receive blocks on a background thread; they arrive already blocked by the server."""
+        publish = update_data if update_data is not None else self._enqueue_block
+
+        def receive():
+            while self.is_connected:
+                try:
+                    kind, payload = self._read_message()
+                except OSError:
+                    kind = None
+                if kind is None:
+                    break
+                if kind == INFO:
+                    self._apply_info(payload)
+                elif kind == BLOCK:
+                    first, timestamp, rows, columns = BLOCK_HEADER.unpack_from(payload)
+                    samples = np.frombuffer(payload, dtype="<f4", offset=BLOCK_HEADER.size)
+                    if self.expected_sample is not None and first > self.expected_sample:
+                        self.stats.count("dropped_samples", first - self.expected_sample)
+                    self.expected_sample = first + rows
+                    self.process_block(samples.reshape(rows, columns).astype(float), publish,
+                                       None if np.isnan(timestamp) else timestamp)
+            if self.is_connected:
+                # The server stopped
+                self.finished = True
+
+        self.thread = threading.Thread(target=receive)
+        self.thread.start()
+
+    def close_connection(self):
+        self.is_connected = False
+        if self.socket is not None:
+            try:
+                # Wakes the receiver thread up from recv
+                self.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        super().close_connection()
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+
+def main():
+    from perf_stats import format_snapshot
+
+    parser = argparse.ArgumentParser(description="Acquire EMG without the GUI and serve it to subscribers")
+    parser.add_argument("port", nargs="?", help="serial port of the device")
+    parser.add_argument("--baudrate", type=int, default=115200)
+    parser.add_argument("--protocol", choices=PROTOCOLS, default="json")
+    parser.add_argument("--sample-rate", type=float, default=DEFAULT_SAMPLE_RATE, help="samples per second of the device")
+    parser.add_argument("--mains", type=float, default=MAINS_FREQUENCY, help="mains frequency to notch out, 0 for none")
+    parser.add_argument("--replay", metavar="FILE", help="serve a recorded session instead of a device")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed")
+    parser.add_argument("--listen", default=DEFAULT_ADDRESS, help="host:port or Unix socket path to serve on")
+    parser.add_argument("--queue", type=int, default=SUBSCRIBER_QUEUE_SIZE, help="blocks buffered per subscriber")
+    parser.add_argument("--stats", action="store_true", help="print acquisition statistics every second")
+    parser.add_argument("--perf-log", metavar="FILE", help="append per-second statistics to FILE as JSON lines")
+    args = parser.parse_args()
+    if (args.port is None) == (args.replay is None):
+        parser.error("give either a serial port or --replay FILE")
+
+    if args.replay:
+        from replay_connection import ReplayConnection
+
+        connection = ReplayConnection(mains_frequency=args.mains)
+        connection.connect(args.replay, args.speed)
+    else:
+        connection = SerialConnection(sample_rate=args.sample_rate, mains_frequency=args.mains)
+        connection.connect(args.port, args.baudrate, args.protocol)
+    if not connection.is_connected:
+        raise SystemExit(1)
+
+    server = AcquisitionServer(connection, args.listen, args.queue)
+    if args.perf_log:
+        server.stats.open_log(args.perf_log)
+    try:
+        server.start()
+    except OSError as e:
+        connection.close_connection()
+        raise SystemExit(f"Cannot listen on {args.listen}: {e}")
+    print(f"Serving {args.replay or args.port} on {args.listen}")
+    try:
+        while not connection.finished:
+            time.sleep(1)
+            if args.stats or server.stats.logging:
+                snapshot = server.stats.snapshot()
+                if args.stats:
+                    print(format_snapshot(snapshot))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        server.stats.close_log()
+
+
+if __name__ == "__main__":
+    main()
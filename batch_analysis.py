@@ -0,0 +1,240 @@
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from feature_extraction import FEATURE_NAMES, WINDOW, HOP, extract_features, model_inputs
+from session_format import EXTENSION as SESSION_EXTENSION
+from session_recorder import RECORDINGS_FOLDER
+
+DATA_FOLDER = "data"
+SUMMARY_FILE = "summary.csv"
+# Remembers what each session looked like when it was last analysed
+CACHE_FILE = ".analysis_cache.json"
+ANALYSIS_SUFFIX = ".analysis.npz"
+# Files in a patient folder that are not recordings
+IGNORED_FILES = ("patient_info.csv", SUMMARY_FILE)
+# Burst indexes sit next to burst recordings
+IGNORED_SUFFIXES = (".bursts.csv",)
+DEFAULT_SAMPLE_RATE = 1000
+SUMMARY_COLUMNS = ["session", "patient", "channels", "duration_s", "windows", "mean_rms", "mean_zc",
+                   "mdf_start_hz", "mdf_end_hz", "mdf_slope_hz_per_min", "fatigue_fraction", "status"]
+
+# Set in each worker process by _init_worker
+_model_error = None
+
+
+def find_sessions(root, include_recordings=False):
+    """Return every recording under ``root``, sorted by path.
+
+    The app's recordings folder is skipped, unless it is ``root`` itself or
+    ``include_recordings`` is set: exported sessions are copies of those
+    recordings, filed under their patient.
+    """
+    recordings = os.path.abspath(RECORDINGS_FOLDER)
+    sessions = []
+    for folder, subfolders, files in os.walk(root):
+        if not include_recordings and folder != root and os.path.abspath(folder) == recordings:
+            subfolders[:] = []
+            continue
+        for name in files:
+            if name in IGNORED_FILES or name.endswith(IGNORED_SUFFIXES):
+                continue
+            if name.endswith(SESSION_EXTENSION) or name.endswith(".csv"):
+                sessions.append(os.path.join(folder, name))
+    return sorted(sessions)
+
+
+def session_signature(path, settings):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns, settings]
+
+
+def _init_worker(model_path):
+    # Load the model once per process rather than once per session
+    global _model_error
+    from models_load import load_rf_model
+
+    try:
+        load_rf_model(model_path)
+    except Exception as e:
+        # First line only; unpickling errors can run to several
+        _model_error = str(e).splitlines()[0] if str(e) else type(e).__name__
+
+
+def session_features(samples, sample_rate, window=WINDOW, hop=HOP, apply_filter_bank=True):
+    """Return the (n_windows, n_channels, n_features) feature timeline of a recording and its window times."""
+    samples = np.asarray(samples, dtype=float).reshape(len(samples), -1)
+    # sosfiltfilt needs some signal to pad with at either end
+    if apply_filter_bank and len(samples) > 3 * window:
+        from filters import design_emg_filter, apply_filter
+
+        samples = apply_filter(samples, design_emg_filter(sample_rate, zero_phase=True))
+
+    features = extract_features(samples, window, hop, sample_rate)
+    times = (np.arange(len(features)) * hop + window / 2) / sample_rate
+    return features, times
+
+
+def predict_session(features, model_error=None):
+    """Return (predictions per window and channel or None, status) for a feature timeline."""
+    from models_load import rf_model_run_batch
+
+    if len(features) == 0:
+        return None, "too short"
+    if model_error is not None:
+        return None, f"no model: {model_error}"
+    try:
+        rows = model_inputs(features.reshape(-1, len(FEATURE_NAMES)))
+        return rf_model_run_batch(rows).reshape(len(features), -1), "ok"
+    except Exception as e:
+        return None, f"prediction failed: {e}"
+
+
+def summarise(features, times, predictions=None):
+    """Session-level figures of a feature timeline, as in the summary table."""
+    summary = {"windows": len(features), "mean_rms": None, "mean_zc": None, "mdf_start_hz": None,
+               "mdf_end_hz": None, "mdf_slope_hz_per_min": None, "fatigue_fraction": None}
+    n_windows = len(features)
+    if n_windows:
+        rms = features[:, :, FEATURE_NAMES.index("rms")]
+        zc = features[:, :, FEATURE_NAMES.index("zc")]
+        mdf = features[:, :, FEATURE_NAMES.index("mdf")].mean(axis=1)
+        # A falling median frequency is the classic sign of muscle fatigue
+        edge = max(n_windows // 10, 1)
+        summary["mean_rms"] = round(float(rms.mean()), 4)
+        summary["mean_zc"] = round(float(zc.mean()), 2)
+        summary["mdf_start_hz"] = round(float(mdf[:edge].mean()), 2)
+        summary["mdf_end_hz"] = round(float(mdf[-edge:].mean()), 2)
+        if n_windows > 1:
+            summary["mdf_slope_hz_per_min"] = round(float(np.polyfit(times, mdf, 1)[0] * 60), 3)
+    if predictions is not None and predictions.size:
+        summary["fatigue_fraction"] = round(float(np.mean(predictions != 0)), 3)
+    return summary
+
+
+def analyse_session(path, root, window=WINDOW, hop=HOP, apply_filter_bank=True):
+    """Compute the feature and fatigue timelines of one recording.
+
+    The timelines are saved next to the recording; the returned dict is its
+    row in the summary table.
+    """
+    from csv_reader import load_recording
+
+    samples, channels, sample_rate = load_recording(path)
+    sample_rate = sample_rate or DEFAULT_SAMPLE_RATE
+    features, times = session_features(samples, sample_rate, window, hop, apply_filter_bank)
+    predictions, status = predict_session(features, _model_error)
+
+    arrays = {"times": times, "features": features, "feature_names": np.array(FEATURE_NAMES),
+              "channels": np.array(channels)}
+    if predictions is not None:
+        arrays["fatigue"] = predictions
+    np.savez(path + ANALYSIS_SUFFIX, **arrays)
+
+    relative = os.path.relpath(path, root)
+    # Patient folders sit directly under the data folder
+    folders = relative.split(os.sep)[:-1]
+    row = {
+        "session": relative,
+        "patient": folders[0] if folders else "",
+        "channels": len(channels),
+        "duration_s": round(len(samples) / sample_rate, 2),
+    }
+    row.update(summarise(features, times, predictions))
+    row["status"] = status
+    return row
+
+
+def run_batch(root=DATA_FOLDER, workers=None, model_path=None, window=WINDOW, hop=HOP, apply_filter_bank=True,
+              force=False):
+    """Analyse every changed session under ``root`` and write the summary table.
+
+    Returns the summary rows, one per session, in path order.
+    """
+    from models_load import MODEL_PATH
+
+    model_path = model_path or MODEL_PATH
+    # A retrained model invalidates every earlier prediction
+    model_stamp = os.stat(model_path).st_mtime_ns if os.path.exists(model_path) else None
+    settings = [window, hop, apply_filter_bank, model_path, model_stamp]
+    cache_path = os.path.join(root, CACHE_FILE)
+    cache = {}
+    if not force and os.path.exists(cache_path):
+        try:
+            with open(cache_path) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+
+    rows = {}
+    pending = []
+    for path in find_sessions(root):
+        entry = cache.get(path)
+        if entry and entry["signature"] == session_signature(path, settings) and os.path.exists(path + ANALYSIS_SUFFIX):
+            rows[path] = entry["row"]
+        else:
+            pending.append(path)
+
+    print(f"{len(rows) + len(pending)} session(s) found, {len(pending)} to analyse")
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_path,)) as pool:
+            futures = {pool.submit(analyse_session, path, root, window, hop, apply_filter_bank): path
+                       for path in pending}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    rows[path] = future.result()
+                    cache[path] = {"signature": session_signature(path, settings), "row": rows[path]}
+                except Exception as e:
+                    # Not cached, so the session is retried on the next run
+                    rows[path] = {"session": os.path.relpath(path, root), "status": f"failed: {e}"}
+                print(f"  {rows[path]['session']}: {rows[path]['status']}")
+
+    # Forget sessions that have been deleted
+    cache = {path: entry for path, entry in cache.items() if path in rows}
+    with open(cache_path, "w") as f:
+        json.dump(cache, f, indent=1)
+
+    ordered = [rows[path] for path in sorted(rows)]
+    with open(os.path.join(root, SUMMARY_FILE), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS)
+        writer.writeheader()
+        writer.writerows(ordered)
+    return ordered
+
+
+def print_summary(rows):
+    columns = ["session", "duration_s", "mean_rms", "mdf_start_hz", "mdf_end_hz", "fatigue_fraction", "status"]
+    widths = [max(len(column), *(len(str(row.get(column, ""))) for row in rows)) for column in columns]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        cells = ["" if row.get(column) is None else str(row.get(column)) for column in columns]
+        print("  ".join(cell.ljust(width) for cell, width in zip(cells, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse every recorded session under a data folder")
+    parser.add_argument("root", nargs="?", default=DATA_FOLDER, help="folder holding the patient folders")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--model", help="fatigue model to use instead of the default")
+    parser.add_argument("--window", type=int, default=WINDOW, help="analysis window in samples")
+    parser.add_argument("--hop", type=int, default=HOP, help="samples between windows")
+    parser.add_argument("--no-filter", action="store_true", help="analyse the raw signal")
+    parser.add_argument("--force", action="store_true", help="re-analyse sessions even if unchanged")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.root):
+        parser.error(f"{args.root} is not a folder")
+
+    start = time.perf_counter()
+    rows = run_batch(args.root, args.workers, args.model, args.window, args.hop, not args.no_filter, args.force)
+    if rows:
+        print_summary(rows)
+    print(f"Summary written to {os.path.join(args.root, SUMMARY_FILE)} in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
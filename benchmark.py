@@ -0,0 +1,238 @@
+import argparse
+import json
+import os
+import platform
+import threading
+import time
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from device_simulator import DeviceSimulator
+from serial_connection import SerialConnection, PLOT_WINDOW
+from replay_connection import ReplayConnection
+
+RESULTS_FOLDER = "benchmark_results"
+FRAME_INTERVAL = 0.1
+# Time allowed after the simulator stops for in-flight samples to arrive
+DRAIN_TIME = 0.5
+SEND_TIME_SLOTS = 1 << 20
+
+
+class PlotProbe:
+    """Headless copy of the live plot's blitting path, used to time frames."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.figure = Figure()
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.axes = []
+        self.lines = []
+        self.background = None
+
+    def setup(self, channels):
+        self.figure.clear()
+        self.axes = list(self.figure.subplots(channels, 1, sharex=True, squeeze=False)[:, 0])
+        self.lines = [ax.plot([], [], animated=True)[0] for ax in self.axes]
+        for ax in self.axes:
+            ax.set_xlim(0, PLOT_WINDOW)
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+
+    def frame(self):
+        start = time.perf_counter()
+        if len(self.lines) != self.connection.channels:
+            self.setup(self.connection.channels)
+        values = self.connection.update_plot(self.lines)
+        if len(values):
+            for index, ax in enumerate(self.axes):
+                low, high = values[:, index].min(), values[:, index].max()
+                bottom, top = ax.get_ylim()
+                if low < bottom or high > top:
+                    ax.set_ylim(low - 0.1 * (high - low), high + 0.1 * (high - low))
+                    self.canvas.draw()
+                    self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.canvas.restore_region(self.background)
+        for ax, line in zip(self.axes, self.lines):
+            ax.draw_artist(line)
+        return time.perf_counter() - start
+
+
+def run_scenario(rate, channels, protocol, duration, malformed_rate=0.0, baudrate=921600):
+    """Stream synthetic EMG through SerialConnection and measure the pipeline."""
+    send_times = np.zeros(SEND_TIME_SLOTS)
+    simulator = DeviceSimulator(rate, channels, protocol, malformed_rate=malformed_rate, send_times=send_times)
+    connection = SerialConnection()
+    connection.connect(simulator.port, baudrate, protocol)
+    if not connection.is_connected:
+        simulator.close()
+        raise RuntimeError(f"Could not open simulated port {simulator.port}")
+
+    received = [0]
+    latencies = []
+    reader_cpu = [0.0]
+    lock = threading.Lock()
+
+    def on_block(block):
+        # Runs on the reader thread, so thread_time() is the ingestion CPU cost
+        now = time.monotonic()
+        with lock:
+            received[0] += len(block["emg"])
+            last = received[0] - 1
+            latencies.append(now - send_times[last % SEND_TIME_SLOTS])
+            reader_cpu[0] = time.thread_time()
+
+    probe = PlotProbe(connection)
+    frame_times = []
+
+    connection.start_reading(on_block)
+    simulator.start()
+    started = time.monotonic()
+    while time.monotonic() - started < duration:
+        frame_times.append(probe.frame())
+        time.sleep(FRAME_INTERVAL)
+    simulator.stop()
+    time.sleep(DRAIN_TIME)
+    connection.close_connection()
+    simulator.close()
+
+    samples = received[0]
+    sent = simulator.samples_sent
+    latencies = np.array(latencies[len(latencies) // 10:])  # Skip warm-up
+    return {
+        "rate": rate,
+        "channels": channels,
+        "protocol": protocol,
+        "duration": duration,
+        "samples_sent": sent,
+        "samples_received": samples,
+        "samples_per_second": samples / duration,
+        "dropped_samples": max(sent - samples, 0),
+        "malformed_lines": simulator.malformed_sent,
+        "malformed_detected": connection.stats.counters.get("malformed_lines", 0),
+        "cpu_per_sample_us": reader_cpu[0] / samples * 1e6 if samples else None,
+        "latency_median_ms": float(np.median(latencies) * 1000) if len(latencies) else None,
+        "latency_p95_ms": float(np.percentile(latencies, 95) * 1000) if len(latencies) else None,
+        "frame_time_median_ms": float(np.median(frame_times) * 1000),
+        "frame_time_p95_ms": float(np.percentile(frame_times, 95) * 1000),
+    }
+
+
+def run_replay(path, speed=None):
+    """Play a recorded session through the pipeline, as fast as possible by default."""
+    connection = ReplayConnection()
+    connection.connect(path, speed)
+    if not connection.is_connected:
+        raise RuntimeError(f"Could not open recording {path}")
+
+    received = [0]
+    reader_cpu = [0.0]
+
+    def on_block(block):
+        received[0] += len(block["emg"])
+        reader_cpu[0] = time.thread_time()
+
+    probe = PlotProbe(connection)
+    frame_times = []
+    started = time.monotonic()
+    connection.start_reading(on_block)
+    while not connection.finished and connection.thread.is_alive():
+        frame_times.append(probe.frame())
+        time.sleep(FRAME_INTERVAL)
+    duration = time.monotonic() - started
+    connection.close_connection()
+
+    samples = received[0]
+    frame_times = frame_times or [probe.frame()]
+    return {
+        "rate": connection.sample_rate,
+        "channels": connection.channels,
+        "protocol": "replay",
+        "duration": duration,
+        "samples_sent": len(connection.samples),
+        "samples_received": samples,
+        "samples_per_second": samples / duration,
+        "dropped_samples": len(connection.samples) - samples,
+        "malformed_lines": 0,
+        "malformed_detected": 0,
+        "cpu_per_sample_us": reader_cpu[0] / samples * 1e6 if samples else None,
+        "latency_median_ms": None,
+        "latency_p95_ms": None,
+        "frame_time_median_ms": float(np.median(frame_times) * 1000),
+        "frame_time_p95_ms": float(np.percentile(frame_times, 95) * 1000),
+    }
+
+
+def scenario_key(result):
+    return f"{result['protocol']}/{result['rate']}Hz/{result['channels']}ch"
+
+
+def print_results(results, baseline=None):
+    columns = ["samples_per_second", "dropped_samples", "cpu_per_sample_us", "latency_median_ms",
+               "latency_p95_ms", "frame_time_median_ms"]
+    previous = {scenario_key(result): result for result in (baseline or {}).get("results", [])}
+    print(f"{'scenario':<22}" + "".join(f"{column:>24}" for column in columns))
+    for result in results:
+        row = f"{scenario_key(result):<22}"
+        for column in columns:
+            value = result[column]
+            cell = "n/a" if value is None else f"{value:.1f}"
+            before = previous.get(scenario_key(result), {}).get(column)
+            if before and value is not None:
+                cell += f" ({(value - before) / before * 100:+.0f}%)"
+            row += f"{cell:>24}"
+        print(row)
+
+
+def save_results(results, folder=RESULTS_FOLDER):
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    path = os.path.join(folder, f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "machine": platform.node(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and latency benchmark of the acquisition pipeline")
+    parser.add_argument("--rates", type=int, nargs="+", default=[1000, 2000])
+    parser.add_argument("--channels", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--protocols", nargs="+", choices=["json", "binary"], default=["json", "binary"])
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per scenario")
+    parser.add_argument("--malformed", type=float, default=0.0, help="fraction of injected malformed lines")
+    parser.add_argument("--replay", metavar="FILE", help="replay a recorded session instead of simulating a device")
+    parser.add_argument("--speed", type=float, default=None, help="replay speed (default: as fast as possible)")
+    parser.add_argument("--compare", help="earlier results file to show changes against")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    # The live pipeline imports scipy lazily; do it here so the first scenario does not pay for it
+    import scipy.signal  # noqa: F401
+
+    results = []
+    if args.replay:
+        print(f"Replaying {args.replay}...", flush=True)
+        results.append(run_replay(args.replay, args.speed))
+    for protocol in ([] if args.replay else args.protocols):
+        for rate in args.rates:
+            for channels in args.channels:
+                print(f"Running {protocol} at {rate} Hz with {channels} channel(s)...", flush=True)
+                results.append(run_scenario(rate, channels, protocol, args.duration, args.malformed))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if not args.no_save:
+        print(f"Results saved to {save_results(results)}")
+
+
+if __name__ == "__main__":
+    main()
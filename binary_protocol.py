@@ -0,0 +1,106 @@
+import struct
+import numpy as np
+
+# Frame layout (little-endian):
+#   sync      2 bytes   0xA5 0x5A
+#   dtype     uint8     1 = int16, 2 = float32
+#   channels  uint8     values per sample, interleaved in the payload
+#   count     uint16    number of samples in the payload
+#   payload   count * channels * itemsize bytes
+#   checksum  uint16    sum of the payload bytes modulo 65536
+# The header itself is not checksummed, so frames are limited in size: a
+# corrupted count or channel byte would otherwise make the decoder wait for
+# a huge payload, holding back every valid frame behind it.
+MAX_FRAME_SAMPLES = 256
+MAX_FRAME_CHANNELS = 16
+SYNC = b"\xa5\x5a"
+HEADER = struct.Struct("<2sBBH")
+CHECKSUM = struct.Struct("<H")
+DTYPES = {1: np.dtype("<i2"), 2: np.dtype("<f4")}
+DTYPE_CODES = {"int16": 1, "float32": 2}
+
+
+def payload_checksum(payload):
+    return int(np.frombuffer(payload, dtype=np.uint8).sum(dtype=np.uint64)) & 0xFFFF
+
+
+def encode_frame(samples, dtype="int16"):
+    """Pack a block of samples, shape (n,) or (n, channels), into a single frame."""
+    code = DTYPE_CODES[dtype]
+    samples = np.asarray(samples)
+    channels = 1 if samples.ndim == 1 else samples.shape[1]
+    if len(samples) > MAX_FRAME_SAMPLES or not 0 < channels <= MAX_FRAME_CHANNELS:
+        raise ValueError(f"A frame holds at most {MAX_FRAME_SAMPLES} samples of {MAX_FRAME_CHANNELS} channels")
+    payload = samples.astype(DTYPES[code]).tobytes()
+    return HEADER.pack(SYNC, code, channels, len(samples)) + payload + CHECKSUM.pack(payload_checksum(payload))
+
+
+class FrameDecoder:
+    """Reassembles frames from arbitrary byte chunks and decodes their payloads.
+
+    Partial frames are kept until the rest arrives. Corrupt frames are
+    skipped by resynchronising on the next sync header. ``channels`` is the
+    channel count reported by the most recent valid frame.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.frames = 0
+        self.bad_frames = 0
+        self.channels = None
+
+    def feed(self, chunk):
+        """Consume a chunk of bytes and return the complete samples as a
+        float64 array of shape (n, channels)."""
+        self._buffer += chunk
+        blocks = []
+        position = 0
+        buffer = self._buffer
+
+        while True:
+            start = buffer.find(SYNC, position)
+            if start < 0:
+                # Keep a trailing byte in case it is the first half of a sync
+                position = max(len(buffer) - 1, position)
+                break
+            if start + HEADER.size > len(buffer):
+                position = start
+                break
+
+            _, code, channels, count = HEADER.unpack_from(buffer, start)
+            dtype = DTYPES.get(code)
+            if dtype is None or not 0 < channels <= MAX_FRAME_CHANNELS or count > MAX_FRAME_SAMPLES:
+                # Not a header a device would send; most likely a corrupted one
+                self.bad_frames += 1
+                position = start + 1
+                continue
+
+            payload_start = start + HEADER.size
+            payload_end = payload_start + count * channels * dtype.itemsize
+            frame_end = payload_end + CHECKSUM.size
+            if frame_end > len(buffer):
+                position = start
+                break
+
+            payload = bytes(buffer[payload_start:payload_end])
+            (checksum,) = CHECKSUM.unpack_from(buffer, payload_end)
+            if checksum != payload_checksum(payload):
+                self.bad_frames += 1
+                position = start + 1
+                continue
+
+            if channels != self.channels:
+                # The device changed its channel count; earlier blocks in
+                # this chunk no longer fit
+                self.bad_frames += len(blocks)
+                blocks = []
+                self.channels = channels
+            blocks.append(np.frombuffer(payload, dtype=dtype).reshape(count, channels))
+            self.frames += 1
+            position = frame_end
+
+        del self._buffer[:position]
+
+        if not blocks:
+            return np.empty((0, self.channels or 1))
+        return np.concatenate(blocks).astype(float)
@@ -0,0 +1,209 @@
+import csv
+import os
+import time
+import numpy as np
+from filters import design_emg_filter, StreamingFilter, MAINS_FREQUENCY
+from ring_buffer import RingBuffer
+
+BURSTS_SUFFIX = ".bursts.csv"
+BURST_COLUMNS = ["onset_s", "offset_s", "first_sample", "samples", "file_sample"]
+# Envelope smoothing time constant
+ENVELOPE_TIME = 0.05
+# Rest level statistics follow the envelope with this time constant
+BASELINE_TIME = 5.0
+# Seconds of signal used to learn the rest level before detecting anything
+CALIBRATION_TIME = 2.0
+# Onset and offset levels, as multiples of the rest envelope
+ONSET_LEVEL = 3.0
+OFFSET_LEVEL = 2.0
+PRE_TRIGGER = 0.25
+POST_TRIGGER = 0.5
+
+
+def rest_level(envelope):
+    """Median envelope per channel; the median so that activity during calibration does not raise it."""
+    return np.maximum(np.median(envelope, axis=0), 1e-12)
+
+
+class BurstCapture:
+    """Recorder front end that only keeps muscle activation bursts.
+
+    Use it in place of a ``SessionRecorder``: raw blocks go in through
+    ``write`` and only the bursts, with ``pre_trigger`` and ``post_trigger``
+    seconds of padding, are passed on to ``recorder``. Detection runs on a
+    band-passed, rectified and smoothed envelope. A burst starts when any
+    channel's envelope exceeds ``onset_level`` times its rest level, and ends
+    once every channel has stayed below ``offset_level`` times it for the
+    post-trigger time. The rest level adapts while the muscle is idle. Each
+    burst is listed, with its times, in a CSV index next to the recording.
+    """
+
+    def __init__(self, recorder, sample_rate, pre_trigger=PRE_TRIGGER, post_trigger=POST_TRIGGER,
+                 onset_level=ONSET_LEVEL, offset_level=OFFSET_LEVEL, mains_frequency=MAINS_FREQUENCY):
+        if offset_level > onset_level:
+            raise ValueError("The offset level must not be above the onset level")
+
+        self.recorder = recorder
+        self.path = recorder.path
+        self.sample_rate = sample_rate
+        self.mains_frequency = mains_frequency
+        self.pre_samples = int(pre_trigger * sample_rate)
+        self.post_samples = int(post_trigger * sample_rate)
+        self.onset_level = onset_level
+        self.offset_level = offset_level
+        self.recorder.info = dict(self.recorder.info, capture="bursts", start_time=time.time(),
+                                  bursts_index=os.path.basename(self.path + BURSTS_SUFFIX))
+
+        self.channels = None
+        self.samples_seen = 0
+        self.bursts = []
+        self.active = False
+        # Samples passed on to the recorder so far, i.e. the position in the file
+        self.kept = 0
+        # Incoming sample number just after the last one written
+        self.kept_until = 0
+        self.error = None
+
+    @property
+    def samples_written(self):
+        return self.recorder.samples_written
+
+    @property
+    def names(self):
+        return self.recorder.names
+
+    @names.setter
+    def names(self, names):
+        self.recorder.names = names
+
+    def start(self):
+        self.recorder.start()
+
+    def _configure(self, channels):
+        from scipy import signal as sps
+
+        self.channels = channels
+        self.filter = StreamingFilter(design_emg_filter(self.sample_rate, mains_frequency=self.mains_frequency), channels)
+        # One-pole low-pass of the rectified signal
+        alpha = 1 - np.exp(-1 / (ENVELOPE_TIME * self.sample_rate))
+        self._envelope_ba = ([alpha], [1, alpha - 1])
+        self._envelope_zi = np.zeros((1, channels))
+        self._lfilter = sps.lfilter
+        self.lookback = RingBuffer(max(self.pre_samples, 1), float, channels)
+        self.rest_level = np.zeros(channels)
+        self.calibration = []
+        self.calibrated = False
+        self.last_active = None
+
+    def envelope(self, samples):
+        rectified = np.abs(self.filter.process(samples))
+        b, a = self._envelope_ba
+        smoothed, self._envelope_zi = self._lfilter(b, a, rectified, axis=0, zi=self._envelope_zi)
+        return smoothed
+
+    def write(self, samples):
+        samples = np.asarray(samples, dtype=float).reshape(len(samples), -1)
+        if len(samples) == 0:
+            return
+        if samples.shape[1] != self.channels:
+            if self.active:
+                self._end_burst(self.samples_seen)
+            self._configure(samples.shape[1])
+
+        envelope = self.envelope(samples)
+        first = self.samples_seen
+        if not self.calibrated:
+            self._calibrate(envelope)
+            self.lookback.extend(samples)
+            self.samples_seen += len(samples)
+            return
+
+        # Activity relative to rest, the most active channel deciding
+        level = (envelope / self.rest_level).max(axis=1)
+        idle = np.ones(len(samples), dtype=bool)
+        position = 0
+        while position < len(samples):
+            if not self.active:
+                onsets = np.flatnonzero(level[position:] > self.onset_level)
+                if len(onsets) == 0:
+                    break
+                onset = position + onsets[0]
+                self._start_burst(samples, onset, first)
+                position = onset
+            else:
+                index = first + np.arange(position, len(samples))
+                # Most recent sample above the offset level, as of each sample
+                recent = np.where(level[position:] > self.offset_level, index, -1)
+                recent = np.maximum(np.maximum.accumulate(recent), self.last_active)
+                ended = np.flatnonzero(index - recent > self.post_samples)
+                stop = position + ended[0] if len(ended) else len(samples)
+                if stop > position:
+                    self._keep(samples[position:stop])
+                    idle[position:stop] = False
+                    self.last_active = int(recent[stop - position - 1])
+                if len(ended) == 0:
+                    break
+                self._end_burst(first + stop)
+                position = stop
+
+        self._adapt(envelope[idle])
+        self.lookback.extend(samples)
+        self.samples_seen += len(samples)
+
+    def _calibrate(self, envelope):
+        self.calibration.append(envelope)
+        if sum(len(block) for block in self.calibration) >= CALIBRATION_TIME * self.sample_rate:
+            self.rest_level = rest_level(np.concatenate(self.calibration))
+            self.calibration = []
+            self.calibrated = True
+
+    def _adapt(self, rest):
+        if len(rest) == 0:
+            return
+        weight = 1 - np.exp(-len(rest) / (BASELINE_TIME * self.sample_rate))
+        self.rest_level += weight * (rest_level(rest) - self.rest_level)
+
+    def _start_burst(self, samples, onset, first):
+        # Pre-trigger padding comes from the look-back buffer and this block,
+        # without anything the previous burst's post-trigger already wrote
+        history = np.concatenate((self.lookback.latest(), samples[:onset]))
+        length = min(self.pre_samples, len(history), first + onset - self.kept_until)
+        padding = history[len(history) - length:]
+        self.active = True
+        self.last_active = first + onset
+        self.bursts.append({
+            "onset_s": (first + onset) / self.sample_rate,
+            "first_sample": first + onset - len(padding),
+            "file_sample": self.kept,
+        })
+        self._keep(padding)
+
+    def _keep(self, samples):
+        if len(samples):
+            self.recorder.write(samples)
+            self.kept += len(samples)
+
+    def _end_burst(self, stop):
+        burst = self.bursts[-1]
+        burst["offset_s"] = (self.last_active + 1) / self.sample_rate
+        burst["samples"] = stop - burst["first_sample"]
+        self.kept_until = stop
+        self.active = False
+
+    def close(self):
+        if self.active:
+            self._end_burst(self.samples_seen)
+        self.recorder.close()
+        self.error = self.recorder.error
+        try:
+            with open(self.path + BURSTS_SUFFIX, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=BURST_COLUMNS)
+                writer.writeheader()
+                writer.writerows(self.bursts)
+        except OSError as e:
+            self.error = self.error or e
+
+    @property
+    def reduction(self):
+        """Fraction of the incoming samples that were not stored."""
+        return 1 - self.kept / self.samples_seen if self.samples_seen else 0.0
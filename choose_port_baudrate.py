@@ -1,9 +1,22 @@
-from PyQt5.QtWidgets import QComboBox, QDialog, QVBoxLayout, QPushButton, QLabel, QHBoxLayout
-from utils import get_ports, get_baudrates
+from PyQt5.QtWidgets import QComboBox, QDialog, QVBoxLayout, QPushButton, QLabel, QHBoxLayout, QGridLayout, QSpinBox
+from utils import get_ports, get_baudrates, get_protocols, get_sample_rates, get_mains_frequencies
+
+
+def rate_combos(sample_rate, mains_frequency):
+    """Editable combo boxes for the device's sample rate and the mains frequency."""
+    sample_rate_combo = QComboBox()
+    sample_rate_combo.addItems(get_sample_rates())
+    sample_rate_combo.setEditable(True)
+    sample_rate_combo.setCurrentText(f"{sample_rate:g}")
+    mains_combo = QComboBox()
+    mains_combo.addItems(get_mains_frequencies())
+    mains_combo.setCurrentText(f"{mains_frequency:g}")
+    return sample_rate_combo, mains_combo
+
 
 class PortBaudrateDialog(QDialog):
     """Dialog for selecting serial port and baud rate."""
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, sample_rate=1000, mains_frequency=50):
         super().__init__(parent)
         self.setWindowTitle("Select Port and Baud Rate")
         
@@ -14,6 +27,8 @@ class PortBaudrateDialog(QDialog):
         # Ensure get_ports() returns a list of strings
         ports = get_ports()
         self.port_combo.addItems(ports)
+        # Editable so a simulated device (e.g. /dev/pts/3) can be typed in
+        self.port_combo.setEditable(True)
         layout.addWidget(QLabel("Port:"))
         layout.addWidget(self.port_combo)
         
@@ -25,6 +40,19 @@ class PortBaudrateDialog(QDialog):
         layout.addWidget(QLabel("Baud Rate:"))
         layout.addWidget(self.baudrate_combo)
         
+        # Create and populate the wire protocol combo box
+        self.protocol_combo = QComboBox()
+        self.protocol_combo.addItems(get_protocols())
+        layout.addWidget(QLabel("Protocol:"))
+        layout.addWidget(self.protocol_combo)
+        
+        # The filters and recording headers depend on both
+        self.sample_rate_combo, self.mains_combo = rate_combos(sample_rate, mains_frequency)
+        layout.addWidget(QLabel("Sample Rate (Hz):"))
+        layout.addWidget(self.sample_rate_combo)
+        layout.addWidget(QLabel("Mains (Hz):"))
+        layout.addWidget(self.mains_combo)
+        
         # Buttons for confirm and cancel actions
         button_layout = QHBoxLayout()
         self.confirm_button = QPushButton("Confirm")
@@ -43,3 +71,84 @@ class PortBaudrateDialog(QDialog):
         port = self.port_combo.currentText()
         baudrate = int(self.baudrate_combo.currentText())
         return port, baudrate
+
+    def get_selected_protocol(self):
+        return self.protocol_combo.currentText()
+
+    def get_selected_sample_rate(self):
+        """Return (sample_rate, mains_frequency); raises ValueError if not a number."""
+        return float(self.sample_rate_combo.currentText()), float(self.mains_combo.currentText())
+
+
+class MultiDeviceDialog(QDialog):
+    """Dialog for selecting the port, baud rate and protocol of several boards."""
+    def __init__(self, parent=None, max_devices=4, sample_rate=1000, mains_frequency=50):
+        super().__init__(parent)
+        self.setWindowTitle("Select Devices")
+
+        layout = QVBoxLayout()
+
+        count_layout = QHBoxLayout()
+        count_layout.addWidget(QLabel("Devices:"))
+        self.count_spin = QSpinBox()
+        self.count_spin.setRange(2, max_devices)
+        self.count_spin.valueChanged.connect(self.update_rows)
+        count_layout.addWidget(self.count_spin)
+        layout.addLayout(count_layout)
+
+        # Every board samples at the same rate
+        rate_layout = QHBoxLayout()
+        self.sample_rate_combo, self.mains_combo = rate_combos(sample_rate, mains_frequency)
+        rate_layout.addWidget(QLabel("Sample Rate (Hz):"))
+        rate_layout.addWidget(self.sample_rate_combo)
+        rate_layout.addWidget(QLabel("Mains (Hz):"))
+        rate_layout.addWidget(self.mains_combo)
+        layout.addLayout(rate_layout)
+
+        # One row of port, baud rate and protocol per device
+        grid = QGridLayout()
+        for column, title in enumerate(["Port", "Baud Rate", "Protocol"], 1):
+            grid.addWidget(QLabel(title), 0, column)
+        self.rows = []
+        for index in range(max_devices):
+            port_combo = QComboBox()
+            port_combo.addItems(get_ports())
+            port_combo.setEditable(True)
+            port_combo.setCurrentIndex(index)
+            baudrate_combo = QComboBox()
+            baudrate_combo.addItems(get_baudrates())
+            protocol_combo = QComboBox()
+            protocol_combo.addItems(get_protocols())
+            widgets = [QLabel(f"Device {index + 1}"), port_combo, baudrate_combo, protocol_combo]
+            for column, widget in enumerate(widgets):
+                grid.addWidget(widget, index + 1, column)
+            self.rows.append(widgets)
+        layout.addLayout(grid)
+        self.update_rows(self.count_spin.value())
+
+        button_layout = QHBoxLayout()
+        self.confirm_button = QPushButton("Confirm")
+        self.confirm_button.clicked.connect(self.accept)
+        button_layout.addWidget(self.confirm_button)
+
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.reject)
+        button_layout.addWidget(self.cancel_button)
+
+        layout.addLayout(button_layout)
+
+        self.setLayout(layout)
+
+    def update_rows(self, count):
+        for index, widgets in enumerate(self.rows):
+            for widget in widgets:
+                widget.setVisible(index < count)
+
+    def get_selected_devices(self):
+        """Return a (port, baudrate, protocol) tuple per device."""
+        return [(port.currentText(), int(baudrate.currentText()), protocol.currentText())
+                for _, port, baudrate, protocol in self.rows[:self.count_spin.value()]]
+
+    def get_selected_sample_rate(self):
+        """Return (sample_rate, mains_frequency); raises ValueError if not a number."""
+        return float(self.sample_rate_combo.currentText()), float(self.mains_combo.currentText())
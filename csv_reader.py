@@ -1,66 +1,176 @@
-import pandas as pd
+import os
+import numpy as np
 from PyQt5.QtWidgets import QMessageBox
 from matplotlib.figure import Figure
+from session_format import SessionFile, is_session_file
+
+# Each pyramid level keeps one min/max pair per PYRAMID_FACTOR buckets of the level below
+PYRAMID_FACTOR = 8
+# Stop adding levels once a level is this small
+PYRAMID_MIN_BUCKETS = 512
+# Samples read per pass while building the first level
+INDEX_CHUNK = PYRAMID_FACTOR * 65536
+PYRAMID_SUFFIX = ".pyramid.npz"
+
+
+def load_recording(filename):
+    """Return (samples, channels, sample_rate) for a CSV or session file.
+
+    Session files are memory-mapped, or decompressed chunk by chunk if they
+    are compressed, so nothing is read until it is sliced.
+    """
+    if is_session_file(filename):
+        session = SessionFile(filename)
+        return session.samples, session.channels, session.sample_rate
+
+    # pandas is slow to import and only needed for CSV recordings
+    import pandas as pd
+
+    df = pd.read_csv(filename)
+    return df.to_numpy(dtype=float), list(df.columns), None
+
+
+def _reduce(mins, maxs):
+    """Combine every PYRAMID_FACTOR buckets into one, padding the last group."""
+    remainder = len(mins) % PYRAMID_FACTOR
+    if remainder:
+        pad = PYRAMID_FACTOR - remainder
+        mins = np.concatenate((mins, np.repeat(mins[-1:], pad, axis=0)))
+        maxs = np.concatenate((maxs, np.repeat(maxs[-1:], pad, axis=0)))
+    shape = (-1, PYRAMID_FACTOR) + mins.shape[1:]
+    return mins.reshape(shape).min(axis=1), maxs.reshape(shape).max(axis=1)
+
+
+def build_pyramid(samples):
+    """Precompute min/max envelopes of a (n_samples, n_channels) array.
+
+    Level ``i`` holds one (min, max) pair per ``PYRAMID_FACTOR ** (i + 1)``
+    samples. The first level is built in chunks so a memory-mapped recording
+    is never loaded at once.
+    """
+    levels = []
+    mins, maxs = [], []
+    for start in range(0, len(samples), INDEX_CHUNK):
+        chunk = np.asarray(samples[start:start + INDEX_CHUNK], dtype=np.float32)
+        chunk_mins, chunk_maxs = _reduce(chunk, chunk)
+        mins.append(chunk_mins)
+        maxs.append(chunk_maxs)
+    if not mins:
+        return levels
+
+    mins, maxs = np.concatenate(mins), np.concatenate(maxs)
+    levels.append((mins, maxs))
+    while len(mins) > PYRAMID_MIN_BUCKETS:
+        mins, maxs = _reduce(mins, maxs)
+        levels.append((mins, maxs))
+    return levels
+
+
+def load_pyramid(filename, samples):
+    """Return the pyramid for a recording, reusing the on-disk index if it is current."""
+    index_path = filename + PYRAMID_SUFFIX
+    stat = os.stat(filename)
+    signature = np.array([stat.st_size, stat.st_mtime_ns, PYRAMID_FACTOR], dtype=np.int64)
+
+    if os.path.exists(index_path):
+        try:
+            with np.load(index_path) as index:
+                if np.array_equal(index["signature"], signature):
+                    count = int(index["levels"])
+                    return [(index[f"min{i}"], index[f"max{i}"]) for i in range(count)]
+        except (OSError, KeyError, ValueError):
+            pass
+
+    levels = build_pyramid(samples)
+    arrays = {"signature": signature, "levels": np.array(len(levels))}
+    for i, (mins, maxs) in enumerate(levels):
+        arrays[f"min{i}"] = mins
+        arrays[f"max{i}"] = maxs
+    try:
+        np.savez(index_path, **arrays)
+    except OSError:
+        # Read-only location; the index is simply rebuilt next time
+        pass
+    return levels
+
+
+class RecordingViewer:
+    """Plots a recording with about as many points as the axes has pixels.
+
+    Zooming or panning re-selects the pyramid level for the visible range, so
+    peaks stay visible at every scale and raw samples are shown once they fit.
+    """
+
+    def __init__(self, figure, filename):
+        self.figure = figure
+        self.ax = figure.get_axes()[0]
+        self.samples, self.channels, self.sample_rate = load_recording(filename)
+        self.levels = load_pyramid(filename, self.samples)
+        self.scale = 1.0 / self.sample_rate if self.sample_rate else 1.0
+        self.lines = []
+
+    def show(self):
+        ax = self.ax
+        ax.clear()
+        self.lines = [ax.plot([], [], label=name, linestyle="-")[0] for name in self.channels]
+
+        ax.set_xlabel("Time (s)" if self.sample_rate else "Sample")
+        ax.set_ylabel("Amplitude")
+        ax.set_title("EMG Recording")
+        ax.legend()
+
+        n = len(self.samples)
+        ax.set_xlim(0, max(n, 1) * self.scale)
+        if self.levels:
+            mins, maxs = self.levels[-1]
+            low, high = float(mins.min()), float(maxs.max())
+            margin = 0.05 * max(high - low, 1e-6)
+            ax.set_ylim(low - margin, high + margin)
+        elif n:
+            low, high = float(np.min(self.samples)), float(np.max(self.samples))
+            margin = 0.05 * max(high - low, 1e-6)
+            ax.set_ylim(low - margin, high + margin)
+
+        self.refine()
+        ax.callbacks.connect("xlim_changed", lambda ax: self.refine())
+        self.figure.tight_layout()
+        self.figure.canvas.draw_idle()
+
+    def refine(self):
+        """Redraw the lines for the current x range at the matching resolution."""
+        n = len(self.samples)
+        if n == 0:
+            return
+        left, right = self.ax.get_xlim()
+        start = int(np.clip(np.floor(left / self.scale), 0, n))
+        stop = int(np.clip(np.ceil(right / self.scale) + 1, start, n))
+        pixels = max(int(self.ax.bbox.width), 1)
+
+        if stop - start <= 2 * pixels or not self.levels:
+            x = np.arange(start, stop) * self.scale
+            y = np.asarray(self.samples[start:stop], dtype=float)
+        else:
+            # Coarsest level that still has at least one bucket per pixel
+            level = 0
+            bucket = PYRAMID_FACTOR
+            while level + 1 < len(self.levels) and (stop - start) / (bucket * PYRAMID_FACTOR) >= pixels:
+                level += 1
+                bucket *= PYRAMID_FACTOR
+            mins, maxs = self.levels[level]
+            first, last = start // bucket, -(-stop // bucket)
+            # Interleave min and max so each bucket draws as a vertical stroke
+            x = np.repeat(np.arange(first, last) * bucket * self.scale, 2)
+            y = np.stack((mins[first:last], maxs[first:last]), axis=1).reshape(-1, len(self.channels))
+
+        for index, line in enumerate(self.lines):
+            line.set_data(x, y[:, index])
 
 
 def read_csv_and_plot(filename, figure: Figure):
     try:
-        # Read the CSV file using pandas
-        df = pd.read_csv(filename)
-
-        # Extract data from the CSV file
-        # time = df["time"]
-        pressure = df["Pressure"]
-        # volume = df["volume"]
-        flowrate = df["Flowrate"]
-
-        ax1, ax2, ax3, ax4 = figure.get_axes()
-
-        # Clear existing plots
-        ax1.clear()
-        ax2.clear()
-        ax3.clear()
-        ax4.clear()
-
-        ax1.plot(
-            pressure, label="Pressure", linestyle="-", color="blue", marker="o"
-        )
-        ax2.plot(flowrate, label="Volume", linestyle="-", color="blue", marker="o")
-        # ax3.plot(
-        #     time, flowrate, label="Flow Rate", linestyle="-", color="blue", marker="o"
-        # )
-        # ax4.plot(
-        #     volume,
-        #     flowrate,
-        #     label="Volume vs Flow Rate",
-        #     linestyle="-",
-        #     color="blue",
-        #     marker="o",
-        # )
-
-        ax1.set_xlabel("Time")
-        ax1.set_ylabel("Pressure")
-        ax1.set_title("Pressure over Time")
-        ax1.legend()
-
-        ax2.set_xlabel("Time")
-        ax2.set_ylabel("Volume")
-        ax2.set_title("Volume over Time")
-        ax2.legend()
-
-        ax3.set_xlabel("Time")
-        ax3.set_ylabel("Flow Rate")
-        ax3.set_title("Flow Rate over Time")
-        ax3.legend()
-
-        ax4.set_xlabel("Volume")
-        ax4.set_ylabel("Flow Rate")
-        ax4.set_title("Volume vs Flow Rate")
-        ax4.legend()
-
-        figure.tight_layout()
-
-        figure.canvas.draw()
+        viewer = RecordingViewer(figure, filename)
+        viewer.show()
+        return viewer
 
     except Exception as e:
         QMessageBox.warning(None, "Error", f"Failed to read CSV file: {e}")
@@ -0,0 +1,159 @@
+import argparse
+import json
+import os
+import threading
+import time
+import numpy as np
+from binary_protocol import encode_frame, MAX_FRAME_SAMPLES
+
+DEFAULT_RATE = 1000
+# How often the simulator wakes up to write the samples that are due
+TICK = 0.005
+# Length of the pre-generated signal that is played in a loop
+LOOP_SECONDS = 10
+
+
+def synthetic_emg(n_samples, channels=1, sample_rate=DEFAULT_RATE, noise=0.05, burst_rate=0.5,
+                  burst_gain=8.0, mains_amplitude=0.2, mains_frequency=50, seed=0):
+    """Generate (n_samples, channels) of EMG-like signal.
+
+    Band-limited noise is amplitude-modulated by random activation bursts,
+    with white sensor noise and mains hum added on top.
+    """
+    rng = np.random.default_rng(seed)
+    # Crude 20-450 Hz shaping: differenced noise smoothed over a few samples
+    raw = rng.normal(size=(n_samples + 8, channels))
+    shaped = np.diff(raw, axis=0)
+    kernel = np.ones(3) / 3
+    shaped = np.apply_along_axis(lambda column: np.convolve(column, kernel, mode="same"), 0, shaped)[:n_samples]
+
+    envelope = np.full((n_samples, channels), 0.1)
+    if burst_rate > 0:
+        n_bursts = rng.poisson(burst_rate * n_samples / sample_rate)
+        for _ in range(n_bursts):
+            start = rng.integers(0, n_samples)
+            length = int(rng.uniform(0.2, 1.0) * sample_rate)
+            channel = rng.integers(0, channels)
+            window = np.hanning(max(length, 2))[:n_samples - start]
+            envelope[start:start + len(window), channel] += burst_gain * window
+
+    t = np.arange(n_samples)[:, np.newaxis] / sample_rate
+    mains = mains_amplitude * np.sin(2 * np.pi * mains_frequency * t)
+    return shaped * envelope + noise * rng.normal(size=(n_samples, channels)) + mains
+
+
+class DeviceSimulator:
+    """Stand-in EMG board behind a pseudo-terminal pair (POSIX only).
+
+    Connect ``SerialConnection`` to ``port`` as if it were a real device. The
+    simulator writes JSON lines (or binary frames) at ``sample_rate`` and
+    records when each sample was written in ``send_times`` so a consumer can
+    measure end-to-end latency. ``malformed_rate`` is the chance of a
+    garbage line being injected before each sample.
+    """
+
+    def __init__(self, sample_rate=DEFAULT_RATE, channels=1, protocol="json", noise=0.05, burst_rate=0.5,
+                 malformed_rate=0.0, send_times=None, seed=0):
+        import pty
+        import tty
+
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.protocol = protocol
+        self.malformed_rate = malformed_rate
+        self.samples_sent = 0
+        self.malformed_sent = 0
+        # Optional numpy array of send timestamps, indexed by sample number modulo its length
+        self.send_times = send_times
+
+        self.signal = synthetic_emg(LOOP_SECONDS * sample_rate, channels, sample_rate, noise, burst_rate, seed=seed)
+        self._rng = np.random.default_rng(seed + 1)
+
+        self.master_fd, self.slave_fd = pty.openpty()
+        # Raw mode so the line discipline neither echoes nor rewrites the data
+        tty.setraw(self.slave_fd)
+        self.port = os.ttyname(self.slave_fd)
+        os.set_blocking(self.master_fd, False)
+
+        self._stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self._stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def close(self):
+        self.stop()
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+    def _encode(self, block):
+        if self.protocol == "binary":
+            # Blocks due after a stall can be longer than one frame
+            return b"".join(encode_frame(block[start:start + MAX_FRAME_SAMPLES] * 1000, "int16")
+                            for start in range(0, len(block), MAX_FRAME_SAMPLES))
+
+        lines = []
+        for row in block:
+            if self.malformed_rate and self._rng.random() < self.malformed_rate:
+                lines.append("{\"emg\": garbage")
+                self.malformed_sent += 1
+            value = round(float(row[0]), 5) if self.channels == 1 else [round(float(v), 5) for v in row]
+            lines.append(json.dumps({"emg": value}))
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    def _run(self):
+        start = time.monotonic()
+        while not self._stop_event.is_set():
+            due = int((time.monotonic() - start) * self.sample_rate) - self.samples_sent
+            if due > 0:
+                first = self.samples_sent % len(self.signal)
+                indices = (first + np.arange(due)) % len(self.signal)
+                payload = self._encode(self.signal[indices])
+                # Stamp before writing so a fast reader never sees a stale timestamp
+                if self.send_times is not None:
+                    sample_numbers = self.samples_sent + np.arange(due)
+                    self.send_times[sample_numbers % len(self.send_times)] = time.monotonic()
+                # A full pty buffer accepts partial writes; this is where a slow reader pushes back
+                view = memoryview(payload)
+                while view and not self._stop_event.is_set():
+                    try:
+                        view = view[os.write(self.master_fd, view):]
+                    except BlockingIOError:
+                        # Nobody is reading; keep checking for stop rather than block for good
+                        self._stop_event.wait(TICK)
+                self.samples_sent += due
+            self._stop_event.wait(TICK)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic EMG on a pseudo-terminal")
+    parser.add_argument("--rate", type=int, default=DEFAULT_RATE, help="samples per second")
+    parser.add_argument("--channels", type=int, default=1)
+    parser.add_argument("--protocol", choices=["json", "binary"], default="json")
+    parser.add_argument("--noise", type=float, default=0.05, help="white noise amplitude")
+    parser.add_argument("--bursts", type=float, default=0.5, help="activation bursts per second")
+    parser.add_argument("--malformed", type=float, default=0.0, help="fraction of malformed lines")
+    args = parser.parse_args()
+
+    simulator = DeviceSimulator(args.rate, args.channels, args.protocol, args.noise, args.bursts, args.malformed)
+    simulator.start()
+    print(f"Simulated EMG device on {simulator.port} ({args.rate} Hz, {args.channels} channel(s), {args.protocol})")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.close()
+
+
+if __name__ == "__main__":
+    main()
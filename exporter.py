@@ -1,28 +1,46 @@
 from PyQt5.QtWidgets import QFileDialog, QMessageBox
-import csv
+import os
+import shutil
+import time
 import numpy as np
+from utils import channel_names
+from session_format import write_session, update_header, is_session_file, EXTENSION as SESSION_EXTENSION
+from burst_capture import BURSTS_SUFFIX
 
 class Exporter:
     def __init__(self, window):
         self.window = window
 
-    def export_data(self, folder_path, data):
+    def export_data(self, folder_path, data, recording_path=None, patient_info=None, sample_rate=1000):
+        """Export a session into the patient's folder; returns the exported file, or None."""
+        if recording_path is not None and os.path.exists(recording_path):
+            # The whole session is already on disk, so copy it as-is, keeping its
+            # name so earlier exports for the same patient are not overwritten
+            filename = os.path.join(folder_path, os.path.basename(recording_path))
+            shutil.copyfile(recording_path, filename)
+            fields = {"patient": patient_info or {}}
+            # Burst captures come with an index of where each burst happened
+            if os.path.exists(recording_path + BURSTS_SUFFIX):
+                shutil.copyfile(recording_path + BURSTS_SUFFIX, filename + BURSTS_SUFFIX)
+                fields["bursts_index"] = os.path.basename(filename + BURSTS_SUFFIX)
+            if is_session_file(filename):
+                update_header(filename, **fields)
+            QMessageBox.information(self.window, "Export Complete", f"Data has been exported to {filename}.")
+            return filename
+
         if not data:
             QMessageBox.warning(self.window, "No Data", "No data to export.")
-            return
+            return None
         
-        filename = folder_path + "/data.csv"
+        filename = os.path.join(folder_path, f"session_{time.strftime('%Y%m%d_%H%M%S')}{SESSION_EXTENSION}")
         if not all(key in data for key in ['emg']):
             QMessageBox.warning(self.window, "Data Error", "Data format is incorrect.")
-            return
-
-        # Export data to a CSV file
-        with open(filename, "w", newline="") as csvfile:
-            csv_writer = csv.writer(csvfile)
+            return None
 
-            csv_writer.writerow(["emg"])
-            min_length = min(len(data["emg"]), len(data["emg"]))
-            for i in range(min_length):
-                csv_writer.writerow([data["emg"][i], data["emg"][i]])
+        # Export data to a session file with the patient details in its header
+        samples = np.asarray(data["emg"])
+        channels = channel_names(1 if samples.ndim == 1 else samples.shape[1])
+        write_session(filename, samples, sample_rate, channels, patient_info)
 
         QMessageBox.information(self.window, "Export Complete", f"Data has been exported to {filename}.")
+        return filename
@@ -0,0 +1,94 @@
+import threading
+import numpy as np
+from models_load import load_rf_model, reload_rf_model, rf_model_run_batch, fatigue_label
+
+# Seconds between classification batches
+DEFAULT_INTERVAL = 1.0
+MAX_PENDING_SUBMISSIONS = 1000
+
+
+class FatigueClassifier:
+    """Classifies fatigue on a worker thread so prediction never blocks ingestion.
+
+    Feature rows are queued with ``submit`` and predicted together once per
+    ``interval``. The model is loaded once when the worker starts. A
+    submission holds one row per channel, or (n_windows, channels, 2) for
+    several windows; the status is "High" when any channel of the latest
+    window is classified as fatigued.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+        self.status = "Normal"
+        self.fatigue_fraction = 0.0
+        self.error = None
+
+        self._pending = []
+        self._latest_channels = 1
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._reload_requested = False
+        self.thread = None
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self._stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def submit(self, features):
+        features = np.asarray(features, dtype=float)
+        if features.size == 0:
+            return
+        channels = features.shape[-2] if features.ndim > 1 else 1
+        features = features.reshape(-1, 2)
+        with self._lock:
+            self._latest_channels = channels
+            self._pending.append(features)
+            # Keep the newest submissions if the worker cannot keep up
+            if len(self._pending) > MAX_PENDING_SUBMISSIONS:
+                del self._pending[:-MAX_PENDING_SUBMISSIONS]
+
+    def reload(self):
+        """Reload the model from disk before the next batch."""
+        self._reload_requested = True
+
+    def _run(self):
+        try:
+            load_rf_model()
+        except Exception as e:
+            self.error = e
+            self.status = "Unavailable"
+            return
+
+        while not self._stop_event.wait(self.interval):
+            if self._reload_requested:
+                self._reload_requested = False
+                try:
+                    reload_rf_model()
+                except Exception as e:
+                    self.error = e
+                    continue
+
+            with self._lock:
+                rows, self._pending = self._pending, []
+                channels = self._latest_channels
+            if not rows:
+                continue
+
+            try:
+                predictions = rf_model_run_batch(np.concatenate(rows))
+            except Exception as e:
+                self.error = e
+                continue
+
+            self.fatigue_fraction = float(np.mean(predictions != 0))
+            latest = predictions[-channels:]
+            self.status = fatigue_label(int(np.any(latest != 0)))
@@ -0,0 +1,113 @@
+import numpy as np
+from models_load import calculate_rms, calculate_zero_crossing, rf_model_run_batch
+
+SAMPLE_RATE = 1000
+# Analysis windows, in samples, shared by the live classifier and the offline analysis
+WINDOW = 256
+HOP = 128
+FEATURE_NAMES = ("mav", "wl", "ssc", "rms", "zc", "mnf", "mdf")
+# Columns the fatigue model was trained on, in order
+MODEL_FEATURES = ("rms", "zc")
+
+
+def sliding_windows(signal, window, hop):
+    """Return a view over the signal without copying, framed along the first
+    axis: (n_windows, window) for a 1-D signal, (n_windows, channels, window)
+    for one of shape (n_samples, channels)."""
+    if window < 1 or hop < 1:
+        raise ValueError("Window and hop must be at least 1")
+
+    signal = np.asarray(signal, dtype=float)
+    if len(signal) < window:
+        return np.empty((0,) + signal.shape[1:] + (window,))
+    return np.lib.stride_tricks.sliding_window_view(signal, window, axis=0)[::hop]
+
+
+def extract_features(signal, window=WINDOW, hop=HOP, sample_rate=SAMPLE_RATE):
+    """Compute time- and frequency-domain EMG features for every analysis window.
+
+    Returns an array of shape (n_windows, len(FEATURE_NAMES)) for a 1-D
+    sample array, e.g. a ring buffer view or a recorded session, and
+    (n_windows, channels, len(FEATURE_NAMES)) for one of shape
+    (n_samples, channels), with every channel computed in the same call.
+    """
+    frames = sliding_windows(signal, window, hop)
+    if len(frames) == 0:
+        return np.empty(frames.shape[:-1] + (len(FEATURE_NAMES),))
+
+    differences = np.diff(frames, axis=-1)
+
+    mav = np.mean(np.abs(frames), axis=-1)
+    wl = np.sum(np.abs(differences), axis=-1)
+    # Slope sign change: neighbouring differences with opposite signs
+    ssc = np.count_nonzero(differences[..., :-1] * differences[..., 1:] < 0, axis=-1)
+    rms = calculate_rms(frames, axis=-1)
+    zc = calculate_zero_crossing(frames, axis=-1)
+
+    # Power spectrum of each mean-removed window
+    centred = frames - frames.mean(axis=-1, keepdims=True)
+    power = np.abs(np.fft.rfft(centred, axis=-1)) ** 2
+    freqs = np.fft.rfftfreq(window, d=1.0 / sample_rate)
+    mnf, mdf = spectral_frequencies(power, freqs)
+
+    return np.stack((mav, wl, ssc, rms, zc, mnf, mdf), axis=-1).astype(float)
+
+
+class WindowedFeatures:
+    """Computes ``extract_features`` on a stream of (n, channels) blocks.
+
+    Each block is framed together with the samples left over from earlier
+    ones, so the windows are exactly those ``extract_features`` gives for the
+    whole signal. Features of completed windows are collected until
+    ``take`` is called.
+    """
+
+    def __init__(self, window=WINDOW, hop=HOP, sample_rate=SAMPLE_RATE, channels=1):
+        self.window = window
+        self.hop = hop
+        self.sample_rate = sample_rate
+        self._tail = np.empty((0, channels))
+        self._features = []
+
+    def update(self, block):
+        joined = np.concatenate((self._tail, np.asarray(block, dtype=float).reshape(-1, self._tail.shape[1])))
+        features = extract_features(joined, self.window, self.hop, self.sample_rate)
+        if len(features):
+            self._features.append(features)
+        # The next window starts one hop after the last one computed
+        self._tail = joined[len(features) * self.hop:]
+
+    def take(self):
+        """Return the (n_windows, channels, n_features) features completed since the last call."""
+        features, self._features = self._features, []
+        if not features:
+            return np.empty((0,) + self._tail.shape[1:] + (len(FEATURE_NAMES),))
+        return np.concatenate(features)
+
+
+def spectral_frequencies(power, freqs):
+    """Mean and median frequency of each power spectrum along the last axis.
+
+    Spectra with no power get 0 for both.
+    """
+    total_power = power.sum(axis=-1)
+    mnf = np.divide(power @ freqs, total_power, out=np.zeros_like(total_power), where=total_power > 0)
+    cumulative_power = np.cumsum(power, axis=-1)
+    mdf = freqs[np.argmax(cumulative_power >= cumulative_power[..., -1:] / 2, axis=-1)]
+    mdf[total_power == 0] = 0
+    return mnf, mdf
+
+
+def model_inputs(features):
+    """Select the columns the fatigue model expects from an extract_features result."""
+    columns = [FEATURE_NAMES.index(name) for name in MODEL_FEATURES]
+    return features[..., columns]
+
+
+def predict_fatigue(signal, window=WINDOW, hop=HOP, sample_rate=SAMPLE_RATE):
+    """Return one fatigue prediction per analysis window (and channel) of the signal."""
+    features = extract_features(signal, window, hop, sample_rate)
+    if len(features) == 0:
+        return np.empty(features.shape[:-1])
+    inputs = model_inputs(features)
+    return rf_model_run_batch(inputs.reshape(-1, len(MODEL_FEATURES))).reshape(features.shape[:-1])
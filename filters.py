@@ -1,12 +1,19 @@
 import numpy as np
 
+# scipy.signal takes around a second to import, so the functions below
+# import it on first use rather than at application start-up
+
+# Local mains frequency, notched out of the EMG; 60 Hz in the Americas
+MAINS_FREQUENCY = 50
+
 def moving_average_filter(data, window_size):
     if window_size < 1:
         raise ValueError("Window size must be at least 1")
 
     data_array = np.array(data)
 
-    cumulative_sum = np.cumsum(data_array, dtype=float)
+    # Leading zero so that each average covers exactly window_size samples
+    cumulative_sum = np.concatenate(([0.0], np.cumsum(data_array, dtype=float)))
 
     moving_avg = (cumulative_sum[window_size:] - cumulative_sum[:-window_size]) / window_size
 
@@ -24,4 +31,109 @@ def integrate_discrete_signal(signal):
 
     integrated_signal = np.cumsum(signal_array)
 
-    return integrated_signal
\ No newline at end of file
+    return integrated_signal
+
+
+def design_emg_filter(sample_rate, band=(20, 450), mains_frequency=MAINS_FREQUENCY, order=4, notch_quality=30,
+                      zero_phase=False):
+    """Band-pass plus mains notch as second-order sections.
+
+    The upper band edge is clamped below Nyquist for low sample rates, and
+    the notch is skipped if the mains frequency is not representable.
+
+    Running sections forwards and backwards squares their magnitude
+    response, so with ``zero_phase`` the sections are designed for
+    ``apply_filter(..., zero_phase=True)``: half the band-pass order, with
+    the band edges and notch width adjusted so the two passes keep the
+    live filter's -3 dB points and pass band. The transition is gentler,
+    though: an octave outside the band the stop band is about 6 dB less
+    attenuated than live.
+    """
+    from scipy import signal as sps
+
+    nyquist = sample_rate / 2
+    low, high = band
+    high = min(high, 0.95 * nyquist)
+    if low >= high:
+        raise ValueError(f"Band {band} is not valid at {sample_rate} Hz")
+
+    if zero_phase:
+        if order % 2:
+            raise ValueError("A zero-phase filter needs an even order")
+        order //= 2
+        low, high = _widen_band(low, high, sample_rate, (np.sqrt(2) - 1) ** (-1 / (2 * order)))
+        # A notch squared is -3 dB further from its centre
+        notch_quality *= 1 / np.sqrt(np.sqrt(2) - 1)
+
+    sos = sps.butter(order, [low, high], btype="bandpass", fs=sample_rate, output="sos")
+    if mains_frequency and mains_frequency < nyquist:
+        b, a = sps.iirnotch(mains_frequency, notch_quality, fs=sample_rate)
+        sos = np.concatenate((sos, sps.tf2sos(b, a)))
+    return sos
+
+
+def _widen_band(low, high, sample_rate, factor):
+    """Band edges whose bandwidth is ``factor`` times wider around the same
+    centre, worked out on the pre-warped frequencies ``butter`` designs with."""
+    warped_low, warped_high = 2 * sample_rate * np.tan(np.pi * np.array([low, high]) / sample_rate)
+    centre_squared = warped_low * warped_high
+    bandwidth = factor * (warped_high - warped_low)
+    warped_high = (bandwidth + np.sqrt(bandwidth ** 2 + 4 * centre_squared)) / 2
+    warped_low = centre_squared / warped_high
+    return sample_rate / np.pi * np.arctan(np.array([warped_low, warped_high]) / (2 * sample_rate))
+
+
+class StreamingFilter:
+    """Applies an SOS filter block by block, carrying the filter state over.
+
+    Blocks have shape (n_samples, n_channels) and every channel is filtered
+    in the same call. Filtering a signal in blocks gives the same result as
+    ``apply_filter(..., zero_phase=False)`` on the whole signal.
+    """
+
+    def __init__(self, sos, channels=1):
+        self.sos = sos
+        self.channels = channels
+        self.zi = None
+
+    def process(self, block):
+        block = np.asarray(block, dtype=float).reshape(-1, self.channels)
+        if len(block) == 0:
+            return block
+        from scipy import signal as sps
+
+        if self.zi is None:
+            self.zi = initial_state(self.sos, block[0])
+        filtered, self.zi = sps.sosfilt(self.sos, block, axis=0, zi=self.zi)
+        return filtered
+
+    def reset(self):
+        self.zi = None
+
+
+def initial_state(sos, first_sample):
+    from scipy import signal as sps
+
+    # Start in steady state for the first sample to avoid a start-up transient
+    return sps.sosfilt_zi(sos)[:, :, np.newaxis] * np.asarray(first_sample, dtype=float)[np.newaxis, np.newaxis, :]
+
+
+def apply_filter(data, sos, zero_phase=True):
+    """Filter a whole recording of shape (n_samples,) or (n_samples, n_channels).
+
+    ``zero_phase`` runs the filter forwards and backwards (no phase delay, for
+    offline analysis); design ``sos`` with ``zero_phase=True`` as well for
+    the same magnitude response as the live filter. Otherwise the result is
+    the causal output the live pipeline produces.
+    """
+    from scipy import signal as sps
+
+    data = np.asarray(data, dtype=float)
+    if zero_phase:
+        return sps.sosfiltfilt(sos, data, axis=0)
+    first_sample = data[0] if data.ndim > 1 else data[:1]
+    zi = initial_state(sos, first_sample)
+    if data.ndim == 1:
+        zi = zi[:, :, 0]
+    filtered, _ = sps.sosfilt(sos, data, axis=0, zi=zi)
+    return filtered
@@ -1,9 +1,69 @@
+import time
+
+# Taken before any other import so the report covers the whole start-up
+START_TIME = time.perf_counter()
+
+import argparse
 import sys
 from PyQt5.QtWidgets import QApplication
-from serial_plotter import SerialPlotter
+from PyQt5.QtCore import QTimer
+from render_scheduler import TARGET_FPS
+
+# Modules that should only be loaded on first use, not before the window shows
+LAZY_MODULES = ["pandas", "scipy", "sklearn", "serial", "matplotlib.pyplot", "csv_reader"]
+
+
+def report_startup(timings):
+    print("Startup profile:")
+    previous = 0.0
+    for name, moment in timings:
+        print(f"  {name:<24} {(moment - previous) * 1000:8.1f} ms   (total {moment * 1000:8.1f} ms)")
+        previous = moment
+    loaded = [name for name in LAZY_MODULES if name in sys.modules]
+    print(f"  Heavy modules loaded:    {', '.join(loaded) if loaded else 'none'}")
+
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = SerialPlotter()
+    parser = argparse.ArgumentParser(description="EMG Monitor")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print how long each start-up stage takes and exit once the window is shown")
+    parser.add_argument("--acquisition", choices=["thread", "process", "server"], default="thread",
+                        help="read the serial port on a thread or in a separate process, "
+                             "or subscribe to an acquisition server")
+    parser.add_argument("--server", metavar="ADDRESS",
+                        help="host:port or Unix socket of the acquisition server (default 127.0.0.1:8765)")
+    parser.add_argument("--capture", choices=["continuous", "bursts"], default="continuous",
+                        help="record every sample or only detected muscle activation bursts")
+    parser.add_argument("--sample-rate", type=float, default=1000,
+                        help="samples per second of the device; can also be set when connecting")
+    parser.add_argument("--mains", type=float, default=50,
+                        help="local mains frequency to notch out (50 or 60 Hz, 0 for none)")
+    parser.add_argument("--fps", type=float, default=TARGET_FPS,
+                        help="highest plot frame rate; lowered automatically when frames take too long")
+    parser.add_argument("--perf-log", metavar="FILE",
+                        help="append per-second acquisition and render timings to FILE as JSON lines")
+    args, qt_args = parser.parse_known_args()
+
+    timings = [("Qt imports", time.perf_counter() - START_TIME)]
+    app = QApplication(sys.argv[:1] + qt_args)
+    timings.append(("QApplication", time.perf_counter() - START_TIME))
+
+    from serial_plotter import SerialPlotter
+    timings.append(("Import SerialPlotter", time.perf_counter() - START_TIME))
+
+    window = SerialPlotter(args.acquisition, args.capture, args.server, args.fps, args.sample_rate, args.mains)
+    timings.append(("Build window", time.perf_counter() - START_TIME))
+    if args.perf_log:
+        window.start_stats_log(args.perf_log)
     window.show()
+
+    if args.profile_startup:
+        def first_frame():
+            timings.append(("First paint", time.perf_counter() - START_TIME))
+            report_startup(timings)
+            app.quit()
+
+        # Runs once the event loop has processed the initial paint
+        QTimer.singleShot(0, first_frame)
+
     sys.exit(app.exec_())
@@ -1,42 +1,73 @@
 import os
 import pickle
+import threading
 import numpy as np
 
-def rf_model_run(features):
-    model_path = "models/rf_model.pkl"  # Update this path as needed
-    
-    if not os.path.exists(model_path):
-        raise FileNotFoundError(f"Model file not found at {model_path}")
+MODEL_PATH = "models/rf_model.pkl"  # Update this path as needed
+
+# The model is unpickled once and shared by every caller
+_rf_model = None
+_rf_model_lock = threading.Lock()
+
+
+def load_rf_model(model_path=MODEL_PATH):
+    global _rf_model
+    with _rf_model_lock:
+        if _rf_model is None:
+            if not os.path.exists(model_path):
+                raise FileNotFoundError(f"Model file not found at {model_path}")
 
-    with open(model_path, "rb") as f:
-        rf_model = pickle.load(f)
+            with open(model_path, "rb") as f:
+                _rf_model = pickle.load(f)
+        return _rf_model
 
-    rf_prediction = rf_model.predict([features])
+
+def reload_rf_model(model_path=MODEL_PATH):
+    """Drop the cached model and load it again, e.g. after retraining."""
+    global _rf_model
+    with _rf_model_lock:
+        _rf_model = None
+    return load_rf_model(model_path)
+
+
+def rf_model_run(features):
+    rf_prediction = load_rf_model().predict([features])
     return rf_prediction[0]
 
 
-def calculate_rms(values):
-    if not values:
+def rf_model_run_batch(feature_rows):
+    """Predict a 2-D array of feature rows in a single model call."""
+    return load_rf_model().predict(np.asarray(feature_rows, dtype=float))
+
+
+def calculate_rms(values, axis=None):
+    if len(values) == 0:
         return 0
     squared_values = np.square(values)
-    mean_squared = np.mean(squared_values)
+    mean_squared = np.mean(squared_values, axis=axis)
     rms = np.sqrt(mean_squared)
     return rms
 
 
-def calculate_zero_crossing(values):
-    if not values:
+def calculate_zero_crossing(values, axis=None):
+    # With an axis, count along it for every row of a 2-D window array
+    if len(values) == 0:
         return 0
-    zero_crossing_count = 0
-    for i in range(1, len(values)):
-        if values[i - 1] * values[i] < 0:
-            zero_crossing_count += 1
-    return zero_crossing_count
+    values = np.asarray(values)
+    if axis is None:
+        values = values.ravel()
+        axis = -1
+    values = np.moveaxis(values, axis, -1)
+    return np.count_nonzero(values[..., :-1] * values[..., 1:] < 0, axis=-1)
 
 
-def determine_fatigue(rms_value, zc_value):
-    prediction_value = rf_model_run([rms_value, zc_value])
+def fatigue_label(prediction_value):
     if prediction_value == 0:
         return "Normal"
     else:
         return "High"
+
+
+def determine_fatigue(rms_value, zc_value):
+    prediction_value = rf_model_run([rms_value, zc_value])
+    return fatigue_label(prediction_value)
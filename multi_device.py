@@ -0,0 +1,281 @@
+import json
+import selectors
+import time
+from collections import deque
+from threading import Thread
+import numpy as np
+from binary_protocol import FrameDecoder
+from serial_connection import SerialConnection, PROTOCOLS, BLOCK_SIZE, BLOCK_INTERVAL
+from utils import channel_names
+
+READ_SIZE = 4096
+# Arrivals used to estimate when each device took its first sample. The
+# smallest recent (arrival - sample time) is the least delayed, and a window
+# rather than the whole history lets the estimate follow clock drift
+OFFSET_WINDOW = 200
+# A device that has sent nothing for this long is treated as stalled: the
+# others carry on and its channels hold its last sample until it resumes
+STALL_TIMEOUT = 0.5
+# Seconds of unmerged samples kept per device
+MAX_BUFFERED_SECONDS = 10
+# Where serial ports cannot be waited on (Windows), every port is polled and
+# the reader sleeps this long when none had anything
+POLL_INTERVAL = 0.002
+
+
+class DeviceStream:
+    """One board of a multi-device session: its port, decoder and unmerged samples.
+
+    ``offset`` estimates the monotonic time of the device's sample 0, so
+    sample ``k`` was taken at about ``offset + k / sample_rate``. After a
+    stall the estimate starts over, since samples were likely lost.
+    """
+
+    def __init__(self, serial_port, protocol, sample_rate, stats):
+        self.serial = serial_port
+        self.protocol = protocol
+        self.sample_rate = sample_rate
+        self.stats = stats
+        self.decoder = FrameDecoder() if protocol == "binary" else None
+        self._line = b""
+        self.channels = None
+        self.buffer = None
+        self.first_index = 0  # Device sample number of buffer[0]
+        self.received = 0
+        self.last_arrival = None
+        self.stalled = False
+        # What the port is registered under when it is waited on with a selector
+        self.fileobj = None
+        self._offsets = deque(maxlen=OFFSET_WINDOW)
+
+    @property
+    def offset(self):
+        return min(self._offsets)
+
+    @property
+    def end_time(self):
+        """Time of the newest sample received."""
+        return self.offset + (self.received - 1) / self.sample_rate
+
+    def read(self, arrival):
+        """Read what the port has; returns whether anything arrived."""
+        chunk = self.serial.read(READ_SIZE)
+        if not chunk:
+            return False
+        samples = self.decoder.feed(chunk) if self.decoder is not None else self._parse_lines(chunk)
+        if len(samples) == 0:
+            return True
+        if self.stalled:
+            print(f"Device {self.serial.port} resumed")
+            self.stalled = False
+            # Re-anchor on the new arrivals; the gap is filled by then
+            self._offsets.clear()
+            self.buffer = self.buffer[-1:]
+            self.first_index = self.received - 1
+        if samples.shape[1] != self.channels:
+            if self.buffer is not None:
+                # The montage changed; what is buffered no longer lines up
+                self.stats.count("dropped_samples", len(self.buffer))
+            self.channels = samples.shape[1]
+            self.buffer = samples
+            self.first_index = self.received
+        else:
+            self.buffer = np.concatenate((self.buffer, samples))
+        excess = len(self.buffer) - int(MAX_BUFFERED_SECONDS * self.sample_rate)
+        if excess > 0:
+            # Merging is not keeping up; never let a buffer grow without bound
+            self.stats.count("dropped_samples", excess)
+            self.buffer = self.buffer[excess:]
+            self.first_index += excess
+        self.received += len(samples)
+        self.last_arrival = arrival
+        self._offsets.append(arrival - (self.received - 1) / self.sample_rate)
+        return True
+
+    def check_stall(self, now):
+        """Mark the device stalled if it has been quiet for STALL_TIMEOUT; returns whether it is."""
+        if not self.stalled and self.last_arrival is not None and now - self.last_arrival > STALL_TIMEOUT:
+            print(f"Device {self.serial.port} stopped sending; holding its last sample")
+            self.stalled = True
+        return self.stalled
+
+    def _parse_lines(self, chunk):
+        lines = (self._line + chunk).split(b"\n")
+        # The last piece is a partial line until its newline arrives
+        self._line = lines.pop()
+        rows = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                value = json.loads(line.decode("utf-8")).get("emg", 0)
+                rows.append(np.asarray(value, dtype=float).reshape(-1))
+            except (ValueError, TypeError, AttributeError):
+                self.stats.count("malformed_lines")
+        widths = {len(row) for row in rows}
+        if not rows or len(widths) > 1:
+            # Mixed widths within a read only happen while a board restarts
+            if rows:
+                self.stats.count("dropped_samples", len(rows))
+            return np.empty((0, self.channels or 1))
+        return np.array(rows)
+
+    def take(self, times):
+        """Return this device's samples nearest to the given times and forget older ones.
+
+        Times after the newest sample get the newest sample, counted as dropped.
+        """
+        missing = int(np.count_nonzero(times > self.end_time + 0.5 / self.sample_rate))
+        if missing:
+            self.stats.count("dropped_samples", missing)
+        index = np.rint((times - self.offset) * self.sample_rate).astype(int) - self.first_index
+        # Clock drift between boards is absorbed by repeating or skipping a sample
+        index = np.clip(index, 0, len(self.buffer) - 1)
+        rows = self.buffer[index]
+        keep = index[-1]
+        self.buffer = self.buffer[keep:]
+        self.first_index += keep
+        return rows
+
+
+def open_selector(devices):
+    """A selector over the devices' ports, or None if they cannot be waited on."""
+    selector = selectors.DefaultSelector()
+    try:
+        for device in devices:
+            # Windows serial handles have no file descriptor
+            device.fileobj = device.serial.fileno()
+            selector.register(device.fileobj, selectors.EVENT_READ, device)
+    except (AttributeError, OSError, ValueError):
+        selector.close()
+        return None
+    return selector
+
+
+class MultiDeviceConnection(SerialConnection):
+    """Acquires from several boards at once and merges them into one session.
+
+    All ports are served by a single thread, waiting on a selector where
+    the ports have pollable file descriptors (POSIX) and polling them in
+    turn otherwise (Windows). Reads are timestamped on arrival, each
+    board's clock is mapped onto the monotonic clock, and the streams are
+    resampled onto one timeline at ``sample_rate``. The merged
+    channels (``d1_emg``, ``d2_emg``, ...) then go through the usual
+    filtering, metrics, plot and recorder path.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.devices = []
+        self.next_time = None
+
+    def connect(self, devices):
+        """Open every (port, baudrate, protocol) in ``devices``; all or nothing."""
+        import serial
+
+        self.devices = []
+        self.next_time = None
+        try:
+            for port, baudrate, protocol in devices:
+                if protocol not in PROTOCOLS:
+                    raise ValueError(f"Unknown protocol: {protocol}")
+                # Non-blocking; the selector or polling says when there is something to read
+                serial_port = serial.Serial(port, baudrate, timeout=0)
+                self.devices.append(DeviceStream(serial_port, protocol, self.sample_rate, self.stats))
+        except (serial.SerialException, ValueError) as e:
+            print(f"Error opening serial port: {e}")
+            self._close_ports()
+            return
+        self.session_info = {"devices": [{"port": port, "baudrate": baudrate, "protocol": protocol}
+                                         for port, baudrate, protocol in devices]}
+        self.is_connected = True
+
+    def configure_channels(self, channels):
+        super().configure_channels(channels)
+        if getattr(self, "devices", None) and all(device.channels for device in self.devices):
+            self.channel_names = [f"d{number}_{name}" for number, device in enumerate(self.devices, 1)
+                                  for name in channel_names(device.channels)]
+            self._update_recorder_names()
+
+    def start_reading(self, update_data=None, block_size=BLOCK_SIZE, block_interval=BLOCK_INTERVAL):
+        publish = update_data if update_data is not None else self._enqueue_block
+        selector = open_selector(self.devices)
+        polled = list(self.devices)
+
+        def read_devices():
+            pending = []
+            pending_count = 0
+            pending_time = None
+            last_flush = time.monotonic()
+            while self.is_connected:
+                if selector is not None:
+                    ready = [key.data for key, _ in selector.select(timeout=block_interval)]
+                else:
+                    ready = list(polled)
+                arrived = False
+                for device in ready:
+                    try:
+                        arrived |= device.read(time.monotonic())
+                    except OSError as e:
+                        # Unplugged (SerialException is an OSError); it stalls from here on
+                        print(f"Device {device.serial.port} disconnected: {e}")
+                        polled.remove(device)
+                        if selector is not None:
+                            selector.unregister(device.fileobj)
+                if selector is None and not arrived:
+                    time.sleep(POLL_INTERVAL)
+                merged = self.merge()
+                if merged is not None:
+                    samples, first_time = merged
+                    if not pending:
+                        pending_time = first_time
+                    pending.append(samples)
+                    pending_count += len(samples)
+                now = time.monotonic()
+                if pending and (pending_count >= block_size or now - last_flush >= block_interval):
+                    self.process_block(np.concatenate(pending), publish, pending_time)
+                    pending = []
+                    pending_count = 0
+                    last_flush = now
+            if pending:
+                self.process_block(np.concatenate(pending), publish, pending_time)
+            if selector is not None:
+                selector.close()
+
+        self.thread = Thread(target=read_devices)
+        self.thread.start()
+
+    def merge(self, now=None):
+        """Resample every device onto the common timeline as far as all live devices have data.
+
+        Stalled devices do not hold the others back; their channels repeat
+        their last sample. Returns (samples, time of the first sample), or
+        None if nothing new is covered yet.
+        """
+        if not self.devices or any(device.buffer is None for device in self.devices):
+            return None
+        now = time.monotonic() if now is None else now
+        live = [device for device in self.devices if not device.check_stall(now)]
+        if not live:
+            return None
+        if self.next_time is None:
+            # The timeline starts once the last device has started
+            self.next_time = max(device.offset for device in self.devices)
+        ready = min(device.end_time for device in live)
+        n = int(np.floor((ready - self.next_time) * self.sample_rate)) + 1
+        if n <= 0:
+            return None
+        times = self.next_time + np.arange(n) / self.sample_rate
+        samples = np.hstack([device.take(times) for device in self.devices])
+        first_time = self.next_time
+        self.next_time += n / self.sample_rate
+        return samples, first_time
+
+    def _close_ports(self):
+        for device in self.devices:
+            if device.serial.is_open:
+                device.serial.close()
+
+    def close_connection(self):
+        super().close_connection()
+        self._close_ports()
@@ -0,0 +1,121 @@
+import json
+import time
+from contextlib import nullcontext
+
+# Shared no-op context returned by PerfStats.time() while timing is off
+_NO_TIMER = nullcontext()
+
+
+class _StageTimer:
+    __slots__ = ("stats", "stage", "start")
+
+    def __init__(self, stats, stage):
+        self.stats = stats
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.stats.add(self.stage, time.perf_counter() - self.start)
+
+
+class PerfStats:
+    """Per-stage timers, counters and gauges for the acquisition and display path.
+
+    Counters (samples, malformed lines, dropped blocks) are plain integer
+    increments and always kept. Stage timers only run while ``enabled`` is
+    set; hot loops should check ``enabled`` before calling ``perf_counter``.
+    Updates come from the reader and GUI threads without a lock; a reading
+    may be off by one update, which is fine for monitoring.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.counters = {}
+        self.gauges = {}
+        # stage -> [total seconds, calls, worst seconds] since the last snapshot
+        self._stages = {}
+        self._last_counters = {}
+        self._last_snapshot = time.monotonic()
+        self._log = None
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def set(self, name, value):
+        self.gauges[name] = value
+
+    def add(self, stage, seconds):
+        entry = self._stages.get(stage)
+        if entry is None:
+            self._stages[stage] = [seconds, 1, seconds]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+            if seconds > entry[2]:
+                entry[2] = seconds
+
+    def time(self, stage):
+        """Context manager timing one pass through ``stage``."""
+        return _StageTimer(self, stage) if self.enabled else _NO_TIMER
+
+    def snapshot(self):
+        """Return the figures for the interval since the previous snapshot.
+
+        Counter rates are per second; stage times are the mean and worst call
+        in milliseconds. The snapshot is also written to the log, if open.
+        """
+        now = time.monotonic()
+        elapsed = max(now - self._last_snapshot, 1e-9)
+        counters = dict(self.counters)
+        stages, self._stages = self._stages, {}
+
+        rates = {name: (value - self._last_counters.get(name, 0)) / elapsed for name, value in counters.items()}
+        snapshot = {
+            "time": time.time(),
+            "interval": elapsed,
+            "rates": rates,
+            "totals": counters,
+            "gauges": dict(self.gauges),
+            "stages": {stage: {"mean_ms": total / calls * 1000, "max_ms": worst * 1000, "calls": calls}
+                       for stage, (total, calls, worst) in stages.items()},
+        }
+        self._last_counters = counters
+        self._last_snapshot = now
+
+        if self._log is not None:
+            self._log.write(json.dumps(snapshot) + "\n")
+            self._log.flush()
+        return snapshot
+
+    @property
+    def logging(self):
+        return self._log is not None
+
+    def open_log(self, path):
+        """Append every following snapshot to ``path`` as one JSON line."""
+        self.close_log()
+        self._log = open(path, "a")
+
+    def close_log(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+def format_snapshot(snapshot):
+    """Multi-line text summary of a snapshot for the on-screen overlay."""
+    rates, totals, gauges = snapshot["rates"], snapshot["totals"], snapshot["gauges"]
+    lines = [
+        f"input     {rates.get('samples', 0):8.0f} samples/s",
+        f"render    {rates.get('frames', 0):8.1f} fps",
+        f"queue     {gauges.get('queue_depth', 0):8d} blocks",
+        f"malformed {totals.get('malformed_lines', 0):8d}   bad frames {totals.get('bad_frames', 0)}",
+        f"dropped   {totals.get('dropped_samples', 0):8d} samples   {totals.get('dropped_blocks', 0)} blocks",
+    ]
+    if "subscribers" in gauges:
+        lines.append(f"clients   {gauges['subscribers']:8d}")
+    for stage, figures in snapshot["stages"].items():
+        lines.append(f"{stage:<9} {figures['mean_ms']:8.2f} ms   max {figures['max_ms']:.2f} ms")
+    return "\n".join(lines)
@@ -0,0 +1,310 @@
+import multiprocessing
+import queue
+import numpy as np
+from multiprocessing import shared_memory
+from perf_stats import PerfStats
+from streaming_spectrum import StreamingSpectrum
+from serial_connection import PLOT_WINDOW, DEFAULT_SAMPLE_RATE, MAINS_FREQUENCY
+from utils import channel_names
+
+# Samples kept in shared memory. The GUI drains new samples once per display
+# frame (every 50 ms at the default 20 fps, see SerialPlotter.label_timer), so
+# this only has to cover the plot window and the odd stalled frame
+SHARED_CAPACITY = 120000
+# Rings are sized for the widest montage so they never have to be reallocated
+MAX_CHANNELS = 8
+SAMPLE_DTYPE = np.float32
+# Seconds to wait for the child to open the port, and to exit on stop
+CONNECT_TIMEOUT = 10
+STOP_TIMEOUT = 2
+
+# Slots of the shared int64 header. GENERATION changes with the channel
+# count, and GENERATION_START is the first sample of the current generation
+TOTAL, CHANNELS, GENERATION, GENERATION_START = range(4)
+# Reader counters mirrored from the child's PerfStats
+COUNTERS = ("samples", "malformed_lines", "bad_frames", "dropped_samples")
+HEADER_SLOTS = 4 + len(COUNTERS)
+
+
+def _array(buffer, shape, dtype):
+    # Backed by shared memory when a buffer is given, private memory otherwise
+    if buffer is None:
+        return np.zeros(shape, dtype=dtype)
+    return np.ndarray(shape, dtype=dtype, buffer=buffer)
+
+
+class SharedRing:
+    """Ring buffer of (n, channels) samples that can live in shared memory.
+
+    Uses the same write-twice layout as ``RingBuffer``, so ``latest`` is a
+    view without copying. There is a single writer, the acquisition process,
+    which publishes samples by bumping the total in the shared header once
+    the rows are in place; readers never see rows that are not written yet.
+    """
+
+    def __init__(self, buffer, header, capacity=SHARED_CAPACITY):
+        self.header = header
+        self.capacity = capacity
+        self._data = _array(buffer, (2 * capacity, MAX_CHANNELS), SAMPLE_DTYPE)
+
+    @staticmethod
+    def nbytes(capacity=SHARED_CAPACITY):
+        return 2 * capacity * MAX_CHANNELS * np.dtype(SAMPLE_DTYPE).itemsize
+
+    def write(self, values, total):
+        """Store ``values`` as samples ``total`` onwards; the caller then publishes the new total."""
+        skipped = max(len(values) - self.capacity, 0)
+        values = values[skipped:]
+        n, channels = values.shape
+        start = (total + skipped) % self.capacity
+        first = min(n, self.capacity - start)
+        for offset in (0, self.capacity):
+            self._data[offset + start:offset + start + first, :channels] = values[:first]
+            self._data[offset:offset + n - first, :channels] = values[first:]
+
+    def latest(self, n=None, total=None):
+        """Return a read-only view of the latest ``n`` samples, oldest first."""
+        total = int(self.header[TOTAL]) if total is None else total
+        available = min(total - int(self.header[GENERATION_START]), self.capacity)
+        n = available if n is None else min(n, available)
+        end = total % self.capacity + self.capacity
+        view = self._data[end - n:end, :int(self.header[CHANNELS])]
+        view.flags.writeable = False
+        return view
+
+    def detach(self, header):
+        """Move to a private copy so the shared segment can be released."""
+        self._data = self._data.copy()
+        self.header = header
+
+
+class SharedFeatures:
+    """Live RMS and zero-crossing values published by the acquisition process."""
+
+    def __init__(self, values, header):
+        self.values = values
+        self.header = header
+
+    @property
+    def rms(self):
+        return self.values[0, :int(self.header[CHANNELS])].copy()
+
+    @property
+    def zero_crossings(self):
+        return self.values[1, :int(self.header[CHANNELS])].astype(int)
+
+
+def _acquire(port, baudrate, protocol, sample_rate, mains_frequency, capacity, names, reading, stop, status,
+             windows):
+    """Child process: read, decode and filter, then publish into shared memory."""
+    from serial_connection import SerialConnection
+
+    segments = [shared_memory.SharedMemory(name=name) for name in names]
+    header = _array(segments[0].buf, HEADER_SLOTS, np.int64)
+    features = _array(segments[1].buf, (2, MAX_CHANNELS), np.float64)
+    raw = SharedRing(segments[2].buf, header, capacity)
+    filtered = SharedRing(segments[3].buf, header, capacity)
+
+    connection = SerialConnection(capacity=capacity, sample_rate=sample_rate, mains_frequency=mains_frequency)
+    connection.connect(port, baudrate, protocol)
+    status.put(connection.is_connected)
+    if connection.is_connected:
+        reading.wait()
+
+        def publish(block):
+            samples = block["emg"]
+            n, channels = samples.shape
+            if channels > MAX_CHANNELS:
+                connection.stats.count("dropped_samples", n)
+                return
+            total = int(header[TOTAL])
+            if channels != header[CHANNELS] or header[GENERATION] == 0:
+                # New montage; the old samples have a different width
+                header[CHANNELS] = channels
+                header[GENERATION_START] = total
+                header[GENERATION] += 1
+            raw.write(samples, total)
+            filtered.write(connection.filtered_data["emg"].latest(n), total)
+            features[0, :channels] = connection.features.rms
+            features[1, :channels] = connection.features.zero_crossings
+            if len(block["features"]):
+                # Few per second, so a queue is cheap enough
+                windows.put(block["features"])
+            for slot, name in enumerate(COUNTERS, 4):
+                header[slot] = connection.stats.counters.get(name, 0)
+            header[TOTAL] = total + n
+
+        connection.start_reading(publish)
+        stop.wait()
+        connection.close_connection()
+
+    # Drop every view before closing the segments
+    del header, features, raw, filtered
+    for segment in segments:
+        segment.close()
+
+
+class ProcessSerialConnection:
+    """Drop-in for ``SerialConnection`` that acquires in a child process.
+
+    Reading, decoding and filtering run in the child, away from the GUI's
+    GIL, and land in shared-memory rings. ``update_plot`` draws straight from
+    shared memory, and ``read_blocks`` returns the samples that arrived since
+    the last call and passes them to the recorder.
+    """
+
+    def __init__(self, capacity=SHARED_CAPACITY, sample_rate=DEFAULT_SAMPLE_RATE, mains_frequency=MAINS_FREQUENCY):
+        self.capacity = capacity
+        self.sample_rate = sample_rate
+        self.mains_frequency = mains_frequency
+        self.is_connected = False
+        self.protocol = "json"
+        self.recorder = None
+        self.session_info = {}
+        self.finished = False
+        self.stats = PerfStats()
+        self.process = None
+        self._windows = None
+        self.segments = []
+        # Computed here from the filtered samples, see enable_spectrum
+        self.spectrum = None
+        self._context = multiprocessing.get_context("spawn")
+        self._bind([None] * 4)
+
+    def _bind(self, buffers):
+        self.header = _array(buffers[0], HEADER_SLOTS, np.int64)
+        self.header[CHANNELS] = 1
+        self.features = SharedFeatures(_array(buffers[1], (2, MAX_CHANNELS), np.float64), self.header)
+        self.data = {"emg": SharedRing(buffers[2], self.header, self.capacity)}
+        self.filtered_data = {"emg": SharedRing(buffers[3], self.header, self.capacity)}
+        self.buffer_data = self.data
+        self._configure()
+
+    def _configure(self):
+        self.channels = int(self.header[CHANNELS])
+        self.channel_names = channel_names(self.channels)
+        self._generation = int(self.header[GENERATION])
+        self._read_total = int(self.header[GENERATION_START])
+        if self.spectrum is not None:
+            self.spectrum = StreamingSpectrum(self.sample_rate, self.channels)
+
+    def set_sample_rate(self, sample_rate, mains_frequency=None):
+        """Use the device's sample rate (and local mains frequency) from the next connection."""
+        self.sample_rate = sample_rate
+        if mains_frequency is not None:
+            self.mains_frequency = mains_frequency
+        if self.spectrum is not None:
+            self.spectrum = StreamingSpectrum(self.sample_rate, self.channels)
+
+    def enable_spectrum(self, enabled=True):
+        """Start or stop computing the live spectrogram and MDF/MNF trend.
+
+        Computed in this process from the displayed signal, which has the
+        moving average applied on top of the filter bank.
+        """
+        self.spectrum = StreamingSpectrum(self.sample_rate, self.channels) if enabled else None
+
+    def connect(self, port, baudrate, protocol="json"):
+        if self.process is not None:
+            return
+        sizes = [HEADER_SLOTS * 8, 2 * MAX_CHANNELS * 8, SharedRing.nbytes(self.capacity),
+                 SharedRing.nbytes(self.capacity)]
+        self.segments = [shared_memory.SharedMemory(create=True, size=size) for size in sizes]
+        self._bind([segment.buf for segment in self.segments])
+
+        self._reading = self._context.Event()
+        self._stop = self._context.Event()
+        status = self._context.Queue()
+        # Model inputs of completed analysis windows
+        self._windows = self._context.Queue()
+        self.process = self._context.Process(
+            target=_acquire, daemon=True,
+            args=(port, baudrate, protocol, self.sample_rate, self.mains_frequency, self.capacity,
+                  [segment.name for segment in self.segments], self._reading, self._stop, status,
+                  self._windows))
+        self.process.start()
+        try:
+            self.is_connected = status.get(timeout=CONNECT_TIMEOUT)
+        except queue.Empty:
+            self.is_connected = False
+        if self.is_connected:
+            self.protocol = protocol
+        else:
+            print(f"Error opening serial port: {port}")
+            self.close_connection()
+
+    def start_reading(self, update_data=None):
+        # Blocks are always drained with read_blocks; callbacks would run in the child
+        if update_data is not None:
+            raise ValueError("Process acquisition does not support block callbacks")
+        self._reading.set()
+
+    def read_blocks(self):
+        """Return the samples published since the last call as a single block."""
+        header = self.header
+        for slot, name in enumerate(COUNTERS, 4):
+            self.stats.counters[name] = int(header[slot])
+        if header[GENERATION] != self._generation:
+            self._configure()
+
+        total = int(header[TOTAL])
+        new = total - self._read_total
+        if new <= 0:
+            return []
+        if new > self.capacity:
+            # The GUI stalled for longer than the ring covers
+            self.stats.count("dropped_blocks")
+        samples = np.array(self.data["emg"].latest(new, total))
+        self._read_total = total
+        if self.recorder is not None:
+            self.recorder.write(samples)
+        if self.spectrum is not None:
+            self.spectrum.update(self.filtered_data["emg"].latest(new, total))
+        windows = []
+        while True:
+            try:
+                windows.append(self._windows.get_nowait())
+            except queue.Empty:
+                break
+        # Rows of a different width belong to the previous montage
+        windows = [rows for rows in windows if rows.shape[1] == self.channels]
+        features = np.concatenate(windows) if windows else np.empty((0, self.channels, 2))
+        return [{"emg": samples, "features": features}]
+
+    def update_plot(self, lines):
+        values = self.filtered_data["emg"].latest(PLOT_WINDOW)
+        x = np.arange(len(values))
+        for index, line in enumerate(lines):
+            line.set_data(x, values[:, index])
+        return values
+
+    def get_data(self):
+        return {"emg": self.data["emg"].latest()}
+
+    def close_connection(self):
+        self.is_connected = False
+        if self.process is not None:
+            self._stop.set()
+            self._reading.set()
+            self.process.join(timeout=STOP_TIMEOUT)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+            self.process = None
+            # Hand the last samples to the recorder before it is closed
+            self.read_blocks()
+        if self.segments:
+            # Keep what was collected on screen and exportable once the segments are gone
+            header = self.header.copy()
+            self.header = header
+            self.features = SharedFeatures(self.features.values.copy(), header)
+            for ring in (self.data["emg"], self.filtered_data["emg"]):
+                ring.detach(header)
+            for segment in self.segments:
+                try:
+                    segment.close()
+                except BufferError:
+                    # A view is still held somewhere; the mapping goes with the process
+                    pass
+                segment.unlink()
+            self.segments = []
@@ -0,0 +1,86 @@
+import time
+from PyQt5.QtCore import QTimer
+
+# Frame rate aimed for while new data keeps arriving
+TARGET_FPS = 20
+# The adaptive rate never drops below this
+MIN_FPS = 2
+# Share of each frame interval rendering may take, leaving the rest of the
+# GUI thread for draining blocks and handling input
+FRAME_BUDGET = 0.5
+# Frame interval multipliers when a frame overruns its budget, and when
+# frames are comfortably inside it again
+SLOW_DOWN = 1.5
+SPEED_UP = 0.9
+# A frame this far inside its budget lets the rate climb back up
+HEADROOM = 0.5
+
+
+class RenderScheduler:
+    """Runs a render callback only when there is something new to show.
+
+    Producers call ``mark_dirty`` when data arrives; a single-shot timer
+    then renders once, no sooner than one frame interval after the last
+    frame. Nothing runs while the flag is clear or the window is hidden, so
+    an idle or minimised window costs no CPU. The interval starts at
+    ``1 / target_fps`` and grows when frames take longer than their budget
+    (down to ``min_fps``), then shrinks back once they fit again.
+    """
+
+    def __init__(self, parent, render, target_fps=TARGET_FPS, min_fps=MIN_FPS):
+        self.render = render
+        self.min_fps = min_fps
+        self.dirty = False
+        self.visible = True
+        self.last_frame = 0.0
+        self.frame_time = 0.0
+        self.timer = QTimer(parent)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self._frame)
+        self.set_target_fps(target_fps)
+
+    def set_target_fps(self, fps):
+        self.target_interval = 1.0 / fps
+        self.interval = self.target_interval
+
+    @property
+    def fps(self):
+        """The current (adapted) maximum frame rate."""
+        return 1.0 / self.interval
+
+    def mark_dirty(self):
+        self.dirty = True
+        self._schedule()
+
+    def set_visible(self, visible):
+        self.visible = visible
+        if visible:
+            self._schedule()
+        else:
+            self.timer.stop()
+
+    def _schedule(self):
+        if not self.dirty or not self.visible or self.timer.isActive():
+            return
+        delay = self.last_frame + self.interval - time.perf_counter()
+        self.timer.start(max(int(delay * 1000), 0))
+
+    def _frame(self):
+        if not self.dirty or not self.visible:
+            return
+        self.dirty = False
+        start = time.perf_counter()
+        self.render()
+        end = time.perf_counter()
+        self.frame_time = end - start
+        self.last_frame = end
+        self._adapt()
+        # Data that arrived while rendering gets its own frame
+        self._schedule()
+
+    def _adapt(self):
+        budget = FRAME_BUDGET * self.interval
+        if self.frame_time > budget:
+            self.interval = min(self.interval * SLOW_DOWN, 1.0 / self.min_fps)
+        elif self.frame_time < HEADROOM * budget and self.interval > self.target_interval:
+            self.interval = max(self.interval * SPEED_UP, self.target_interval)
@@ -0,0 +1,74 @@
+import time
+from threading import Thread
+import numpy as np
+from serial_connection import SerialConnection, BLOCK_SIZE, BLOCK_INTERVAL
+
+# Replay speeds offered in the GUI; None replays as fast as the pipeline allows
+REPLAY_SPEEDS = {"1x": 1.0, "2x": 2.0, "5x": 5.0, "10x": 10.0, "Max": None}
+
+
+class ReplayConnection(SerialConnection):
+    """Plays a recorded session through the live pipeline instead of a serial port.
+
+    Samples go through the same filtering, metrics, block hand-off and
+    recorder hooks as live data, paced at ``speed`` times real time, or as
+    fast as possible when ``speed`` is None. ``finished`` is set once the
+    whole recording has been played.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.path = None
+        self.samples = None
+        self.speed = 1.0
+        self.position = 0
+
+    def connect(self, path, speed=1.0, protocol=None):
+        from csv_reader import load_recording
+
+        try:
+            samples, names, sample_rate = load_recording(path)
+        except (OSError, ValueError) as e:
+            print(f"Error opening recording: {e}")
+            return
+
+        self.path = path
+        # Session files are read lazily (memory-mapped or chunk by chunk) as they play
+        self.samples = samples
+        self.speed = speed
+        self.position = 0
+        self.finished = False
+        self.sample_rate = sample_rate or self.sample_rate
+        self.configured_channels = len(names)
+        self.configure_channels(len(names))
+        self.channel_names = list(names)
+        self.is_connected = True
+
+    def start_reading(self, update_data=None, block_size=BLOCK_SIZE, block_interval=BLOCK_INTERVAL):
+        """Play the recording on a background thread, in blocks like the serial reader."""
+        publish = update_data if update_data is not None else self._enqueue_block
+        if self.speed:
+            # One block per interval of wall-clock time, as the serial reader would hand over
+            step = max(int(self.sample_rate * self.speed * block_interval), 1)
+        else:
+            step = block_size
+
+        def replay():
+            first = self.position
+            start = time.monotonic()
+            for position in range(first, len(self.samples), step):
+                if not self.is_connected:
+                    return
+                block = np.asarray(self.samples[position:position + step], dtype=float)
+                if self.speed:
+                    # A block is due once its last sample would have been received
+                    due = start + (position + len(block) - first) / (self.sample_rate * self.speed)
+                    delay = due - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                self.process_block(block.reshape(len(block), -1), publish)
+                self.position = position + len(block)
+            self.finished = True
+
+        self.thread = Thread(target=replay)
+        self.thread.start()
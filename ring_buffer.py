@@ -0,0 +1,85 @@
+import threading
+import numpy as np
+
+
+class RingBuffer:
+    """Fixed-capacity, preallocated buffer holding the most recent samples.
+
+    Every sample is written twice, at ``i`` and ``i + capacity``, so the
+    latest ``n`` samples are always contiguous in memory and can be returned
+    as a view without copying. With ``channels`` set, each sample is a row
+    of that many values and views have shape (n, channels).
+    """
+
+    def __init__(self, capacity, dtype=float, channels=None):
+        if capacity < 1:
+            raise ValueError("Capacity must be at least 1")
+
+        self.capacity = capacity
+        self.channels = channels
+        shape = (2 * capacity,) if channels is None else (2 * capacity, channels)
+        self._data = np.zeros(shape, dtype=dtype)
+        self._index = 0  # Next write position in [0, capacity)
+        self._count = 0  # Number of valid samples, at most capacity
+        self.total_written = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def append(self, value):
+        with self._lock:
+            self._data[self._index] = value
+            self._data[self._index + self.capacity] = value
+            self._advance(1)
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)
+        if self.channels is not None:
+            values = values.reshape(-1, self.channels)
+        n = len(values)
+        if n == 0:
+            return
+        if n > self.capacity:
+            # Only the tail can survive, so skip writing the rest
+            values = values[-self.capacity:]
+            skipped = n - self.capacity
+            n = self.capacity
+        else:
+            skipped = 0
+
+        with self._lock:
+            start = self._index
+            first = min(n, self.capacity - start)
+            # Primary copy, wrapping at capacity
+            self._data[start:start + first] = values[:first]
+            self._data[:n - first] = values[first:]
+            # Mirror copy in the second half
+            self._data[start + self.capacity:start + self.capacity + first] = values[:first]
+            self._data[self.capacity:self.capacity + n - first] = values[first:]
+            self.total_written += skipped
+            self._advance(n)
+
+    def _advance(self, n):
+        self._index = (self._index + n) % self.capacity
+        self._count = min(self._count + n, self.capacity)
+        self.total_written += n
+
+    def latest(self, n=None):
+        """Return a read-only view of the latest ``n`` samples, oldest first.
+
+        The view shares memory with the buffer, so take a copy if it has to
+        outlive further writes.
+        """
+        with self._lock:
+            n = self._count if n is None else min(n, self._count)
+            end = self._index + self.capacity
+            view = self._data[end - n:end]
+        view.flags.writeable = False
+        return view
+
+    def clear(self):
+        with self._lock:
+            self._index = 0
+            self._count = 0
+            self.total_written = 0
@@ -1,65 +1,312 @@
-import serial
 import json
+import queue
+import time
 from threading import Thread
 import numpy as np
-from filters import moving_average_filter, integrate_discrete_signal
-import matplotlib.pyplot as plt
+from filters import design_emg_filter, StreamingFilter, MAINS_FREQUENCY
+from ring_buffer import RingBuffer
+from streaming_features import StreamingFeatures
+from feature_extraction import WindowedFeatures, model_inputs
+from binary_protocol import FrameDecoder
+from perf_stats import PerfStats
+from streaming_spectrum import StreamingSpectrum
+from utils import channel_names
+
+# Roughly ten minutes of EMG at 1 kHz
+DEFAULT_CAPACITY = 600000
+DEFAULT_SAMPLE_RATE = 1000
+# Band-pass 20-450 Hz plus a notch at the local mains frequency
+APPLY_FILTER_BANK = True
+PLOT_WINDOW = 200
+FILTER_WINDOW = 5
+# Samples covered by the RMS and zero-crossing labels; the fatigue model
+# gets its inputs over feature_extraction's windows instead
+METRIC_WINDOW = 1000
+# Binary mode reads in large chunks with a short timeout to bound latency
+BINARY_READ_SIZE = 4096
+BINARY_READ_TIMEOUT = 0.02
+PROTOCOLS = ("json", "binary")
+# Samples are handed to consumers in blocks, whichever limit is hit first
+BLOCK_SIZE = 50
+BLOCK_INTERVAL = 0.02
+BLOCK_QUEUE_SIZE = 256
 
 class SerialConnection:
-    def __init__(self):
+    def __init__(self, capacity=DEFAULT_CAPACITY, channels=None, sample_rate=DEFAULT_SAMPLE_RATE,
+                 mains_frequency=MAINS_FREQUENCY):
         self.serial = None
         self.is_connected = False
+        self.protocol = "json"
+        self.capacity = capacity
+        self.sample_rate = sample_rate
+        self.mains_frequency = mains_frequency
+        # None means the channel count is taken from the device's first block
+        self.configured_channels = channels
+        # Optional StreamingSpectrum fed with the band-passed signal
+        self.spectrum = None
+        self.configure_channels(channels or 1)
+
+        self.block_queue = queue.Queue(maxsize=BLOCK_QUEUE_SIZE)
+        # Optional SessionRecorder receiving every stored sample
+        self.recorder = None
+        # Extra fields for the recording header, e.g. the devices of a multi-device session
+        self.session_info = {}
+        # Set by sources that end on their own, such as a replay
+        self.finished = False
+        self.thread = None
+        # Stage timings are off until the overlay or a log asks for them
+        self.stats = PerfStats()
+
+    def configure_channels(self, channels):
+        """Allocate the sample buffers for a channel count, discarding old data.
+
+        Samples are stored as (n_samples, n_channels) arrays under the "emg" key.
+        """
+        self.channels = channels
+        self.channel_names = channel_names(channels)
+        self._update_recorder_names()
+        self.data = {"emg": RingBuffer(self.capacity, np.float32, channels)}
+        self.filtered_data = {"emg": RingBuffer(self.capacity, np.float32, channels)}
+        # The session buffer shares storage with the raw data
+        self.buffer_data = self.data
+        self.features = StreamingFeatures(METRIC_WINDOW, FILTER_WINDOW, channels)
+        # The fatigue model's inputs, framed like the offline analysis
+        self.window_features = WindowedFeatures(sample_rate=self.sample_rate, channels=channels)
+        # Designed on the first block so scipy is not needed at start-up
+        self.filter_bank = None
+        if self.spectrum is not None:
+            self.spectrum = StreamingSpectrum(self.sample_rate, channels)
+
+    def _update_recorder_names(self):
+        # The recorder writes its header with the first chunk, after the montage is known
+        recorder = getattr(self, "recorder", None)
+        if recorder is not None:
+            recorder.names = self.channel_names
+
+    def set_sample_rate(self, sample_rate, mains_frequency=None):
+        """Use the device's sample rate (and local mains frequency) from now on; clears the buffers."""
+        self.sample_rate = sample_rate
+        if mains_frequency is not None:
+            self.mains_frequency = mains_frequency
+        self.configure_channels(self.channels)
 
-        # Changed data structure to handle only EMG data
-        self.data = {"emg": []}
-        self.filtered_data = {"emg": []}
-        self.buffer_data = {"emg": []}
+    def enable_spectrum(self, enabled=True):
+        """Start or stop computing the live spectrogram and MDF/MNF trend."""
+        self.spectrum = StreamingSpectrum(self.sample_rate, self.channels) if enabled else None
 
-    def connect(self, port, baudrate):
+    def connect(self, port, baudrate, protocol="json"):
+        # pyserial is only needed once a port is opened
+        import serial
+
+        if protocol not in PROTOCOLS:
+            raise ValueError(f"Unknown protocol: {protocol}")
         if self.serial is None or not self.serial.is_open:
             try:
-                self.serial = serial.Serial(port, baudrate, timeout=1)
+                timeout = BINARY_READ_TIMEOUT if protocol == "binary" else 1
+                self.serial = serial.Serial(port, baudrate, timeout=timeout)
+                self.protocol = protocol
                 self.is_connected = True
             except serial.SerialException as e:
                 print(f"Error opening serial port: {e}")
 
-    def start_reading(self, update_data):
+    def start_reading(self, update_data=None, block_size=BLOCK_SIZE, block_interval=BLOCK_INTERVAL):
+        """Read samples on a background thread and hand them over in blocks.
+
+        A block is emitted once ``block_size`` samples are pending or
+        ``block_interval`` seconds have passed. Each block is passed to
+        ``update_data`` on the reader thread if given, otherwise it is put on
+        ``block_queue`` for the consumer to drain with ``read_blocks``.
+        """
+        publish = update_data if update_data is not None else self._enqueue_block
+        stats = self.stats
+
+        def flush(pending):
+            try:
+                samples = np.array(pending, dtype=float).reshape(len(pending), -1)
+            except (ValueError, TypeError):
+                stats.count("dropped_samples", len(pending))
+                return
+            try:
+                self.process_block(samples, publish)
+            except Exception as e:
+                # Lose the block, not the reader thread
+                stats.count("dropped_samples", len(samples))
+                print(f"Error processing samples: {e}")
+
+        def read_binary():
+            decoder = FrameDecoder()
+            pending = []
+            pending_count = 0
+            last_flush = time.monotonic()
+            while self.is_connected:
+                timed = stats.enabled
+                if timed:
+                    started = time.perf_counter()
+                chunk = self.serial.read(BINARY_READ_SIZE)
+                if chunk:
+                    if timed:
+                        decoding = time.perf_counter()
+                        stats.add("read", decoding - started)
+                    bad_frames = decoder.bad_frames
+                    samples = decoder.feed(chunk)
+                    if decoder.bad_frames != bad_frames:
+                        stats.count("bad_frames", decoder.bad_frames - bad_frames)
+                    if timed:
+                        stats.add("decode", time.perf_counter() - decoding)
+                    if len(samples):
+                        if pending and samples.shape[1] != pending[0].shape[1]:
+                            # The montage changed; keep every block rectangular
+                            flush(np.concatenate(pending))
+                            pending = []
+                            pending_count = 0
+                        pending.append(samples)
+                        pending_count += len(samples)
+                now = time.monotonic()
+                if pending and (pending_count >= block_size or now - last_flush >= block_interval):
+                    flush(np.concatenate(pending))
+                    pending = []
+                    pending_count = 0
+                    last_flush = now
+            if pending:
+                flush(np.concatenate(pending))
+
         def read_serial():
+            pending = []
+            line_channels = None
+            last_flush = time.monotonic()
             while self.is_connected:
-                data = self.serial.readline().decode('utf-8').strip()
-                if data:
+                timed = stats.enabled
+                if timed:
+                    started = time.perf_counter()
+                data = self.serial.readline()
+                if timed:
+                    decoding = time.perf_counter()
+                    stats.add("read", decoding - started)
+                if data.strip():
                     try:
-                        json_data = json.loads(data)
-                        self.append_data(json_data)
-                        self.filter_data()
-                        update_data(json_data)
-                    except (ValueError, json.JSONDecodeError):
-                        pass
-        
-        self.thread = Thread(target=read_serial)
+                        json_data = json.loads(data.decode('utf-8'))
+                        # "emg" is a number for one channel or a list for a montage
+                        value = json_data.get("emg", 0)
+                        if isinstance(value, list):
+                            width = len(value)
+                            # A montage is a non-empty, flat list of numbers
+                            if width == 0 or not all(isinstance(item, (int, float)) for item in value):
+                                raise ValueError("Not a flat list of samples")
+                        else:
+                            width = 1
+                            float(value)
+                        if width != line_channels:
+                            # Keep every block rectangular
+                            if pending:
+                                flush(pending)
+                                pending = []
+                            line_channels = width
+                        pending.append(value)
+                    except (ValueError, TypeError, AttributeError):
+                        # Line noise, a partial line or an unexpected payload
+                        stats.count("malformed_lines")
+                    if timed:
+                        stats.add("decode", time.perf_counter() - decoding)
+                now = time.monotonic()
+                if pending and (len(pending) >= block_size or now - last_flush >= block_interval):
+                    flush(pending)
+                    pending = []
+                    last_flush = now
+            if pending:
+                flush(pending)
+
+        target = read_binary if self.protocol == "binary" else read_serial
+        self.thread = Thread(target=target)
         self.thread.start()
 
-    def append_data(self, json_data):
-        self.data["emg"].append(json_data.get("emg", 0))
-        self.buffer_data["emg"].append(json_data.get("emg", 0))
+    def process_block(self, samples, publish, timestamp=None):
+        """Store, filter and publish one (n_samples, n_channels) block from the reader thread.
+
+        ``timestamp``, the time of the first sample if known, is passed on
+        with the block as "time".
+        """
+        if samples.shape[1] == 0:
+            # Nothing to store, and a montage of zero channels is not one
+            self.stats.count("dropped_samples", len(samples))
+            return
+        if samples.shape[1] != self.channels:
+            if self.configured_channels is not None:
+                # Device disagrees with the configured montage
+                self.stats.count("dropped_samples", len(samples))
+                return
+            self.configure_channels(samples.shape[1])
+        self.append_block(samples)
+        self.stats.count("samples", len(samples))
+        # Model inputs of the windows completed by this block, (n_windows, channels, 2)
+        block = {"emg": samples, "features": model_inputs(self.window_features.take())}
+        if timestamp is not None:
+            block["time"] = timestamp
+        publish(block)
+
+    def _enqueue_block(self, block):
+        # Drop the oldest block rather than stall the reader if nobody drains
+        try:
+            self.block_queue.put_nowait(block)
+        except queue.Full:
+            try:
+                self.block_queue.get_nowait()
+                self.stats.count("dropped_blocks")
+            except queue.Empty:
+                pass
+            self.block_queue.put_nowait(block)
+
+    def read_blocks(self):
+        """Return all blocks queued since the last call, oldest first."""
+        blocks = []
+        while True:
+            try:
+                blocks.append(self.block_queue.get_nowait())
+            except queue.Empty:
+                return blocks
 
-    def filter_data(self):
-        window_size = 5
-        self.filtered_data["emg"] = moving_average_filter(self.data["emg"], window_size)
+    def append_data(self, json_data):
+        value = json_data.get("emg", 0)
+        self.append_block(np.array(value, dtype=float).reshape(1, self.channels))
 
-    def update_plot(self, ax1):
+    def append_block(self, samples):
+        self.data["emg"].extend(samples)
+        if self.recorder is not None:
+            self.recorder.write(samples)
+        self.filter_data(samples)
 
-        self.data["emg"] = self.data["emg"][-200:]
-        self.filtered_data["emg"] = self.filtered_data["emg"][-200:]
+    def filter_data(self, values):
+        # Only the new samples are filtered; metrics update alongside
+        if APPLY_FILTER_BANK:
+            if self.filter_bank is None:
+                sos = design_emg_filter(self.sample_rate, mains_frequency=self.mains_frequency)
+                self.filter_bank = StreamingFilter(sos, self.channels)
+            with self.stats.time("filter"):
+                values = self.filter_bank.process(values)
+        self.window_features.update(values)
+        spectrum = self.spectrum
+        if spectrum is not None:
+            with self.stats.time("spectrum"):
+                spectrum.update(values)
+        with self.stats.time("metrics"):
+            values = self.features.update(values)
+        self.filtered_data["emg"].extend(values)
 
-        ax1.clear()
-        ax1.plot(self.filtered_data["emg"], color='red', linestyle='-', linewidth=2)
+    def update_plot(self, lines):
+        values = self.filtered_data["emg"].latest(PLOT_WINDOW)
+        x = np.arange(len(values))
+        for index, line in enumerate(lines):
+            line.set_data(x, values[:, index])
+        return values
 
     def get_data(self):
         # Return buffer data containing EMG data
-        return self.buffer_data
+        return {"emg": self.buffer_data["emg"].latest()}
     
     def close_connection(self):
+        # Let the reader finish its current read and flush before closing the port
+        self.is_connected = False
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
         if self.serial is not None and self.serial.is_open:
             self.serial.close()
-        self.is_connected = False
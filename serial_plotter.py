@@ -1,19 +1,44 @@
-from PyQt5.QtWidgets import QFileDialog, QMainWindow, QVBoxLayout, QHBoxLayout, QPushButton, QWidget, QSizePolicy, QMessageBox, QComboBox, QLabel
-from PyQt5.QtCore import QTimer, Qt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
-from serial_connection import SerialConnection
+from PyQt5.QtWidgets import QFileDialog, QMainWindow, QVBoxLayout, QHBoxLayout, QPushButton, QWidget, QSizePolicy, QMessageBox, QComboBox, QLabel, QInputDialog
+from PyQt5.QtCore import QTimer, Qt, QEvent
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas, NavigationToolbar2QT
+from matplotlib.figure import Figure
+import os
+import threading
+import time
+import numpy as np
+from serial_connection import SerialConnection, PLOT_WINDOW, DEFAULT_SAMPLE_RATE, MAINS_FREQUENCY
 from exporter import Exporter
 from patient_info_dialog import PatientInfoDialog
-from csv_reader import read_csv_and_plot
-from choose_port_baudrate import PortBaudrateDialog
+from choose_port_baudrate import PortBaudrateDialog, MultiDeviceDialog
 from utils import apply_dark_mode_to_plot, apply_dark_mode_to_pyqt
-from models_load import calculate_rms, determine_fatigue, calculate_zero_crossing  # Import functions
+from fatigue_classifier import FatigueClassifier
+from session_recorder import SessionRecorder, EXTENSIONS, RECORDINGS_FOLDER
+from session_catalog import SessionCatalog
+from perf_stats import format_snapshot
+from render_scheduler import RenderScheduler, TARGET_FPS
+from streaming_spectrum import SPECTROGRAM_HISTORY, SPECTRUM_WINDOW, SPECTRUM_HOP, TREND_HISTORY
+
+# Format used to stream sessions to disk while collecting: "csv", "binary" or "compressed"
+RECORDING_FORMAT = "compressed"
+# "thread" reads the port on a thread of this process, "process" in a child
+# process that hands samples over through shared memory, "server" subscribes
+# to a headless acquisition server (see acquisition_server) that owns the port
+ACQUISITION_MODE = "thread"
+# "continuous" records every sample, "bursts" only muscle activations with padding
+CAPTURE_MODE = "continuous"
+# Colour range of the spectrogram below its loudest bin
+SPECTROGRAM_RANGE_DB = 50
 
 class SerialPlotter(QMainWindow):
-    def __init__(self):
+    def __init__(self, acquisition_mode=ACQUISITION_MODE, capture_mode=CAPTURE_MODE, server_address=None,
+                 target_fps=TARGET_FPS, sample_rate=DEFAULT_SAMPLE_RATE, mains_frequency=MAINS_FREQUENCY):
         super().__init__()
+        self.acquisition_mode = acquisition_mode
+        self.capture_mode = capture_mode
+        self.server_address = server_address
+        # Defaults for the connection dialogs; a server or a replay brings its own rate
+        self.sample_rate = sample_rate
+        self.mains_frequency = mains_frequency
 
         self.setWindowTitle("EMG Monitor XL VER. 1.0")
         self.setGeometry(100, 100, 1000, 900)
@@ -25,13 +50,19 @@ class SerialPlotter(QMainWindow):
         main_layout = QVBoxLayout(main_widget)
 
         # Create figure and canvas for the plot
-        self.figure, self.ax = plt.subplots()
+        self.figure = Figure()
         self.canvas = FigureCanvas(self.figure)
+        # Zoom and pan, mainly for browsing recordings opened in the viewer
+        main_layout.addWidget(NavigationToolbar2QT(self.canvas, self))
         main_layout.addWidget(self.canvas)
         
-        apply_dark_mode_to_plot(self.figure, self.ax)
         apply_dark_mode_to_pyqt(self)
 
+        self.show_spectrum = False
+        self.setup_axes(["emg"])
+        self.frame_time = 0.0
+        self.canvas.mpl_connect("draw_event", self.cache_background)
+
         # Create layout for RMS, fatigue, and zero-crossing labels
         labels_layout = QHBoxLayout()
 
@@ -68,96 +99,477 @@ class SerialPlotter(QMainWindow):
         self.connect_button.clicked.connect(self.connect_serial)
         controls_layout.addWidget(self.connect_button)
 
+        self.devices_button = QPushButton("Multi")
+        self.devices_button.clicked.connect(self.connect_devices)
+        controls_layout.addWidget(self.devices_button)
+
+        self.open_button = QPushButton("Open")
+        self.open_button.clicked.connect(self.read_csv)
+        controls_layout.addWidget(self.open_button)
+
+        self.replay_button = QPushButton("Replay")
+        self.replay_button.clicked.connect(self.start_replay)
+        controls_layout.addWidget(self.replay_button)
+
         self.export_start_button = QPushButton("Export")
         self.export_start_button.clicked.connect(self.start_export)
         self.export_start_button.setEnabled(True)
         controls_layout.addWidget(self.export_start_button)
 
+        self.spectrum_button = QPushButton("Spectrum")
+        self.spectrum_button.setCheckable(True)
+        self.spectrum_button.toggled.connect(self.toggle_spectrum)
+        controls_layout.addWidget(self.spectrum_button)
+
+        self.stats_button = QPushButton("Stats")
+        self.stats_button.setCheckable(True)
+        self.stats_button.toggled.connect(self.toggle_stats_overlay)
+        controls_layout.addWidget(self.stats_button)
+
         # Add controls layout to main layout
         main_layout.addLayout(controls_layout)
 
-        self.serial_connection = SerialConnection()
+        if acquisition_mode == "process":
+            from process_acquisition import ProcessSerialConnection
+
+            self.serial_connection = ProcessSerialConnection(sample_rate=sample_rate, mains_frequency=mains_frequency)
+        elif acquisition_mode == "server":
+            from acquisition_server import SubscriberConnection, DEFAULT_ADDRESS
+
+            self.serial_connection = SubscriberConnection(mains_frequency=mains_frequency)
+            self.server_address = server_address or DEFAULT_ADDRESS
+        else:
+            self.serial_connection = SerialConnection(sample_rate=sample_rate, mains_frequency=mains_frequency)
+        self.stats = self.serial_connection.stats
+        # A replay temporarily takes the place of the live connection
+        self.live_connection = self.serial_connection
         self.exporter = Exporter(self)
+        self.catalog = SessionCatalog()
+        self.index_thread = None
+        self.recorder = None
+        self.recording_path = None
+
+        # Fatigue is classified in batches on a worker thread, started with
+        # the first collection so the model is not loaded at start-up
+        self.fatigue_classifier = FatigueClassifier()
+
+        # The plots are only redrawn when new data has been drained, and not
+        # while the window is hidden
+        self.render_scheduler = RenderScheduler(self, self.update_plot, target_fps)
+
+        # Drain sample blocks from the reader and refresh the labels at display
+        # rate; runs only while collecting
+        self.label_timer = QTimer(self)
+        self.label_timer.setInterval(int(1000 / target_fps))
+        self.label_timer.timeout.connect(self.update_data)
 
-        # Create an animation for updating the plots
-        self.animation = FuncAnimation(self.figure, self.update_plot, interval=100)
+        # Performance overlay, drawn over the top-left corner of the plot
+        self.stats_overlay = QLabel(self.canvas)
+        self.stats_overlay.setStyleSheet(
+            "font-family: monospace; font-size: 11px; color: #e0e0e0; background-color: rgba(0, 0, 0, 160); padding: 4px;")
+        self.stats_overlay.move(8, 8)
+        self.stats_overlay.hide()
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.update_stats)
 
     def read_csv(self):
         filename, _ = QFileDialog.getOpenFileName(
-            self, "Open CSV File", "", "CSV Files (*.csv)"
+            self, "Open Recording", "", "Recordings (*.csv *.emgs)"
         )
         if filename:
-            read_csv_and_plot(filename, self.figure)
+            # The viewer pulls in pandas, so load it on first use
+            from csv_reader import read_csv_and_plot
+
+            # The viewer takes over the figure; the live axes are set up
+            # again by the next update_plot
+            self.figure.clear()
+            apply_dark_mode_to_plot(self.figure, self.figure.add_subplot())
+            self.axes, self.lines, self.animated = [], [], []
+            self.background = None
+            self.viewer = read_csv_and_plot(filename, self.figure)
+            self.canvas.draw()
 
     def connect_serial(self):
         if self.serial_connection.is_connected:
             # Disconnect the serial connection
             self.serial_connection.close_connection()
-            self.connect_button.setText("Collect")
-            self.export_start_button.setEnabled(True)
+            self.stop_recording()
+            self.serial_connection = self.live_connection
+            self.serial_connection.enable_spectrum(self.show_spectrum)
+            self.set_collecting(False)
+        elif self.acquisition_mode == "server":
+            # The server owns the port; collecting means subscribing to its stream
+            self.serial_connection.connect(self.server_address)
+            if self.serial_connection.is_connected:
+                self.setup_axes(self.serial_connection.channel_names)
+                self.set_collecting(True)
+                self.start_recording()
+                self.serial_connection.start_reading()
+            else:
+                QMessageBox.warning(self, "Connection Error",
+                                    f"Failed to connect to the acquisition server at {self.server_address}.")
         else:
             # Connect to the serial port
-            dialog = PortBaudrateDialog(self)
+            dialog = PortBaudrateDialog(self, self.sample_rate, self.mains_frequency)
             if dialog.exec_():
                 port, baudrate = dialog.get_selected_port_and_baudrate()
+                protocol = dialog.get_selected_protocol()
                 try:
-                    self.serial_connection.connect(port, baudrate)
+                    self.sample_rate, self.mains_frequency = dialog.get_selected_sample_rate()
+                    self.serial_connection.set_sample_rate(self.sample_rate, self.mains_frequency)
+                    self.serial_connection.connect(port, baudrate, protocol)
                     if self.serial_connection.is_connected:
-                        self.connect_button.setText("Stop")
-                        self.export_start_button.setEnabled(False)
-                        self.serial_connection.start_reading(self.update_data)
+                        self.set_collecting(True)
+                        self.start_recording()
+                        self.serial_connection.start_reading()
                     else:
                         QMessageBox.warning(self, "Connection Error", "Failed to connect to the serial port.")
                 except Exception as e:
                     QMessageBox.warning(self, "Error", f"An error occurred while connecting: {e}")
 
-    def update_data(self, values):
-        self.serial_connection.append_data(values)
+    def set_collecting(self, collecting):
+        """Switch the buttons between collecting and idle."""
+        self.connect_button.setText("Stop" if collecting else "Collect")
+        if collecting:
+            self.label_timer.start()
+        else:
+            self.label_timer.stop()
+        self.port_baudrate_button.setEnabled(not collecting)
+        self.devices_button.setEnabled(not collecting)
+        self.open_button.setEnabled(not collecting)
+        self.replay_button.setEnabled(not collecting)
+        self.export_start_button.setEnabled(not collecting)
+
+    def connect_devices(self):
+        """Collect from several boards at once as one session."""
+        if self.serial_connection.is_connected:
+            return
+        dialog = MultiDeviceDialog(self, sample_rate=self.sample_rate, mains_frequency=self.mains_frequency)
+        if not dialog.exec_():
+            return
+        from multi_device import MultiDeviceConnection
+
+        try:
+            self.sample_rate, self.mains_frequency = dialog.get_selected_sample_rate()
+        except ValueError:
+            QMessageBox.warning(self, "Error", "The sample rate and mains frequency must be numbers.")
+            return
+        connection = MultiDeviceConnection(sample_rate=self.sample_rate, mains_frequency=self.mains_frequency)
+        connection.stats = self.stats
+        connection.connect(dialog.get_selected_devices())
+        if not connection.is_connected:
+            QMessageBox.warning(self, "Connection Error", "Failed to connect to every device.")
+            return
+        connection.enable_spectrum(self.show_spectrum)
+        # Nothing changes until reading has started, so a failure leaves the app as it was
+        try:
+            connection.start_reading()
+        except Exception as e:
+            connection.close_connection()
+            QMessageBox.warning(self, "Error", f"An error occurred while reading the devices: {e}")
+            return
+        self.serial_connection = connection
+        self.set_collecting(True)
+        self.start_recording()
+
+    def start_replay(self):
+        if self.serial_connection.is_connected:
+            return
+        filename, _ = QFileDialog.getOpenFileName(self, "Replay Recording", RECORDINGS_FOLDER,
+                                                  "Recordings (*.csv *.emgs)")
+        if not filename:
+            return
+        from replay_connection import ReplayConnection, REPLAY_SPEEDS
 
+        speed, ok = QInputDialog.getItem(self, "Replay Speed", "Speed:", list(REPLAY_SPEEDS), 0, False)
+        if not ok:
+            return
 
-        rms_value = calculate_rms(self.serial_connection.buffer_data['emg'])
-        zero_crossing_count = calculate_zero_crossing(self.serial_connection.buffer_data['emg'])
+        replay = ReplayConnection(mains_frequency=self.mains_frequency)
+        replay.stats = self.stats
+        replay.connect(filename, REPLAY_SPEEDS[speed])
+        if not replay.is_connected:
+            QMessageBox.warning(self, "Replay Error", f"Failed to open {filename}.")
+            return
+        replay.enable_spectrum(self.show_spectrum)
+        self.serial_connection = replay
+        # The recording may differ in montage and sample rate
+        self.setup_axes(replay.channel_names)
+        self.set_collecting(True)
+        # Replays are classified like live data but not recorded again
+        self.fatigue_classifier.start()
+        replay.start_reading()
 
-        fatigue_status = "Normal" # determine_fatigue(rms_value, zero_crossing_count)
+    def update_data(self):
+        blocks = self.serial_connection.read_blocks()
+        self.stats.set("queue_depth", len(blocks))
+        if not blocks:
+            if self.serial_connection.finished and self.serial_connection.is_connected:
+                # The whole recording has been played, or the server stopped
+                self.connect_serial()
+            return
 
+        for block in blocks:
+            self.fatigue_classifier.submit(block["features"])
+        self.render_scheduler.mark_dirty()
 
-        # Update labels
-        self.rms_label.setText(f"RMS: {rms_value:.2f}")
-        self.zero_crossing_label.setText(f"Zero-Crossing: {zero_crossing_count}")
+        # The reader thread has already stored the samples and updated the metrics
+        features = self.serial_connection.features
+        rms_value = features.rms
+        zero_crossing_count = features.zero_crossings
+
+        fatigue_status = self.fatigue_classifier.status
+
+
+        # Update labels, one value per channel
+        self.rms_label.setText("RMS: " + " | ".join(f"{value:.2f}" for value in rms_value))
+        self.zero_crossing_label.setText("Zero-Crossing: " + " | ".join(f"{value}" for value in zero_crossing_count))
         self.fatigue_label.setText(f"Fatigue: {fatigue_status}")
 
-    def update_plot(self, frame):
-        self.ax.clear()
-        # Update the plot with EMG data
-        self.serial_connection.update_plot(self.ax)
-        # Set title and labels for the plot
-        self.ax.set_title("EMG Data")
-        self.ax.set_xlabel("Time")
-        self.ax.set_ylabel("Amplitude")
-        self.ax.grid(which='both', color='gray', linestyle='--', linewidth=0.5)
-        # Redraw the canvas to display the updated plot
+    def setup_axes(self, names):
+        """Create one stacked axes and line per channel name, plus the spectrum panels if shown.
+
+        Static decorations are drawn once and cached as the blit background.
+        """
+        channels = len(names)
+        self.figure.clear()
+        panels = list(self.figure.subplots(channels + 2 * self.show_spectrum, 1, squeeze=False)[:, 0])
+        self.axes = panels[:channels]
+        for ax in self.axes[1:]:
+            ax.sharex(self.axes[0])
+        self.ax = self.axes[0]
+        self.lines = []
+        for ax, name in zip(self.axes, names):
+            apply_dark_mode_to_plot(self.figure, ax)
+            ax.set_ylabel("Amplitude" if channels == 1 else name)
+            ax.grid(which='both', color='gray', linestyle='--', linewidth=0.5)
+            ax.set_xlim(0, PLOT_WINDOW)
+            ax.set_ylim(-1, 1)
+            line, = ax.plot([], [], color='red', linestyle='-', linewidth=2 if channels == 1 else 1, animated=True)
+            self.lines.append(line)
+        self.axes[0].set_title("EMG Data")
+        self.axes[-1].set_xlabel("Time")
+        # Every artist redrawn on each frame, with its axes
+        self.animated = list(zip(self.axes, self.lines))
+        if self.show_spectrum:
+            self.setup_spectrum_axes(*panels[channels:])
+        self.background = None
+
+    def setup_spectrum_axes(self, spectrogram_ax, trend_ax):
+        """Spectrogram image and MDF/MNF trend lines, both updated in place each frame."""
+        rate = self.serial_connection.sample_rate
+        frame_interval = SPECTRUM_HOP / rate
+        for ax in (spectrogram_ax, trend_ax):
+            apply_dark_mode_to_plot(self.figure, ax)
+
+        # Newest frame on the right, time in seconds before now
+        self.spectrogram_pixels = np.zeros((SPECTRUM_WINDOW // 2 + 1, SPECTROGRAM_HISTORY), dtype=np.float32)
+        self.spectrogram_image = spectrogram_ax.imshow(
+            self.spectrogram_pixels, origin="lower", aspect="auto", cmap="magma", animated=True,
+            extent=(-SPECTROGRAM_HISTORY * frame_interval, 0, 0, rate / 2), vmin=-SPECTROGRAM_RANGE_DB, vmax=0)
+        spectrogram_ax.set_ylabel("Frequency (Hz)")
+
+        self.mdf_line, = trend_ax.plot([], [], color="cyan", label="MDF", animated=True)
+        self.mnf_line, = trend_ax.plot([], [], color="yellow", label="MNF", animated=True)
+        trend_ax.set_xlim(-TREND_HISTORY * frame_interval, 0)
+        trend_ax.set_ylim(0, rate / 4)
+        trend_ax.set_ylabel("Hz")
+        trend_ax.set_xlabel("Seconds")
+        trend_ax.grid(which='both', color='gray', linestyle='--', linewidth=0.5)
+        trend_ax.legend(loc="upper left")
+        self.trend_ax = trend_ax
+        self.animated += [(spectrogram_ax, self.spectrogram_image), (trend_ax, self.mdf_line),
+                          (trend_ax, self.mnf_line)]
+
+    def toggle_spectrum(self, visible):
+        self.show_spectrum = visible
+        self.serial_connection.enable_spectrum(visible)
+        self.setup_axes(self.serial_connection.channel_names)
         self.canvas.draw()
 
+    def update_spectrum(self):
+        """Copy the newest spectrum frames into the image and trend lines.
+
+        Returns True if the trend axis had to be rescaled.
+        """
+        spectrum = self.serial_connection.spectrum
+        if spectrum is None:
+            return False
+
+        rows = spectrum.spectrogram.latest()
+        self.spectrogram_pixels[:, :SPECTROGRAM_HISTORY - len(rows)] = np.nan
+        if len(rows):
+            self.spectrogram_pixels[:, SPECTROGRAM_HISTORY - len(rows):] = rows.T
+            top = float(rows.max())
+            bottom, current_top = self.spectrogram_image.get_clim()
+            # Follow the signal level, but not every small fluctuation
+            if abs(top - current_top) > 6:
+                self.spectrogram_image.set_clim(top - SPECTROGRAM_RANGE_DB, top)
+        self.spectrogram_image.set_data(self.spectrogram_pixels)
+
+        trend = spectrum.trend.latest()
+        t = (np.arange(len(trend)) - len(trend) + 1) * spectrum.frame_interval
+        self.mdf_line.set_data(t, trend[:, 0])
+        self.mnf_line.set_data(t, trend[:, 1])
+        return self.update_limits(self.trend_ax, trend)
+
+    def cache_background(self, event):
+        # Any full redraw (resize, limit change) invalidates the cached background
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        for ax, artist in self.animated:
+            ax.draw_artist(artist)
+
+    def update_plot(self):
+        start = time.perf_counter()
+
+        # The montage is only known once the device has sent data
+        if len(self.lines) != self.serial_connection.channels:
+            self.setup_axes(self.serial_connection.channel_names)
+
+        # Update the lines in place with EMG data
+        values = self.serial_connection.update_plot(self.lines)
+
+        limits_changed = [self.update_limits(ax, values[:, index]) for index, ax in enumerate(self.axes)]
+        if self.show_spectrum:
+            limits_changed.append(self.update_spectrum())
+        if any(limits_changed) or self.background is None or not self.canvas.supports_blit:
+            # Full redraw; the draw event re-caches the background
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+            for ax, artist in self.animated:
+                ax.draw_artist(artist)
+        self.canvas.blit(self.figure.bbox)
+
+        # Smoothed frame time, shown in the status bar
+        elapsed = time.perf_counter() - start
+        self.stats.count("frames")
+        if self.stats.enabled:
+            self.stats.add("draw", elapsed)
+        self.frame_time = elapsed if self.frame_time == 0 else 0.9 * self.frame_time + 0.1 * elapsed
+        self.statusBar().showMessage(f"Frame time: {self.frame_time * 1000:.1f} ms   "
+                                     f"(up to {self.render_scheduler.fps:.0f} fps)")
+
+    def update_limits(self, ax, values):
+        """Rescale the y axis only when the data leaves the view or shrinks well inside it."""
+        if len(values) == 0:
+            return False
+        low, high = values.min(), values.max()
+        bottom, top = ax.get_ylim()
+        span = max(high - low, 1e-6)
+        if low >= bottom and high <= top and span > 0.25 * (top - bottom):
+            return False
+        margin = 0.1 * span
+        ax.set_ylim(low - margin, high + margin)
+        return True
+
+    def toggle_stats_overlay(self, visible):
+        self.stats_overlay.setVisible(visible)
+        self.update_stats_collection()
+
+    def start_stats_log(self, path):
+        """Append a snapshot of the performance figures to ``path`` every second."""
+        self.stats.open_log(path)
+        self.update_stats_collection()
+
+    def update_stats_collection(self):
+        # Stage timers only cost anything while someone is looking at them
+        self.stats.enabled = self.stats_overlay.isVisible() or self.stats.logging
+        if self.stats.enabled and not self.stats_timer.isActive():
+            self.stats_timer.start(1000)
+        elif not self.stats.enabled:
+            self.stats_timer.stop()
+
+    def update_stats(self):
+        snapshot = self.stats.snapshot()
+        if self.stats_overlay.isVisible():
+            self.stats_overlay.setText(format_snapshot(snapshot))
+            self.stats_overlay.adjustSize()
+            self.stats_overlay.raise_()
+
     def show_port_baudrate_dialog(self):
-        dialog = PortBaudrateDialog(self)
+        if self.serial_connection.is_connected:
+            return
+        dialog = PortBaudrateDialog(self, self.sample_rate, self.mains_frequency)
         if dialog.exec_():
             port, baudrate = dialog.get_selected_port_and_baudrate()
+            protocol = dialog.get_selected_protocol()
             try:
-                self.serial_connection.connect(port, baudrate)
+                self.sample_rate, self.mains_frequency = dialog.get_selected_sample_rate()
+                self.serial_connection.set_sample_rate(self.sample_rate, self.mains_frequency)
+                self.serial_connection.connect(port, baudrate, protocol)
                 if self.serial_connection.is_connected:
-                    self.connect_button.setText("Stop")
-                    self.export_start_button.setEnabled(False)
-                    self.serial_connection.start_reading(self.update_data)
+                    self.set_collecting(True)
+                    self.start_recording()
+                    self.serial_connection.start_reading()
                 else:
                     QMessageBox.warning(self, "Connection Error", "Failed to connect to the serial port.")
             except Exception as e:
                 QMessageBox.warning(self, "Error", f"An error occurred while connecting: {e}")
 
+    def start_recording(self):
+        self.fatigue_classifier.start()
+
+        # Stream the new session to disk so it never has to fit in memory
+        filename = f"session_{time.strftime('%Y%m%d_%H%M%S')}{EXTENSIONS[RECORDING_FORMAT]}"
+        self.recording_path = os.path.join(RECORDINGS_FOLDER, filename)
+        self.recorder = SessionRecorder(self.recording_path, RECORDING_FORMAT,
+                                        sample_rate=self.serial_connection.sample_rate,
+                                        names=self.serial_connection.channel_names,
+                                        info=dict(self.serial_connection.session_info, start_time=time.time()))
+        if self.capture_mode == "bursts":
+            from burst_capture import BurstCapture
+
+            self.recorder = BurstCapture(self.recorder, self.serial_connection.sample_rate,
+                                         mains_frequency=self.serial_connection.mains_frequency)
+        self.recorder.start()
+        self.serial_connection.recorder = self.recorder
+
+    def stop_recording(self):
+        # Called after the reader has stopped, so this is the final flush
+        self.serial_connection.recorder = None
+        if self.recorder is not None:
+            self.recorder.close()
+            if self.recorder.error is not None:
+                QMessageBox.warning(self, "Recording Error", f"Failed to record session: {self.recorder.error}")
+            else:
+                # Summaries need the whole recording read back, so they are computed off the GUI thread
+                # Not a daemon, so closing the app does not cut the summary short
+                self.index_thread = threading.Thread(target=self.catalog.index_recording,
+                                                     args=(self.recording_path,))
+                self.index_thread.start()
+            self.recorder = None
+
     def start_export(self):
         dialog = PatientInfoDialog(self)
         if dialog.exec_():
-            self.exporter.export_data(self.folder_path, self.serial_connection.get_data())
+            filename = self.exporter.export_data(self.folder_path, self.serial_connection.get_data(),
+                                                 self.recording_path, self.patient_info,
+                                                 sample_rate=self.serial_connection.sample_rate)
+            if filename is not None and self.recording_path is not None:
+                self.catalog.set_patient(self.recording_path, self.patient_info, self.folder_path, filename)
+
+    def showEvent(self, event):
+        self.render_scheduler.set_visible(True)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.render_scheduler.set_visible(False)
+        super().hideEvent(event)
+
+    def changeEvent(self, event):
+        if event.type() == QEvent.WindowStateChange:
+            # Minimising does not hide the window, but nothing drawn would be seen
+            self.render_scheduler.set_visible(not self.isMinimized())
+        super().changeEvent(event)
 
     def closeEvent(self, event):
         self.serial_connection.close_connection()
+        self.stop_recording()
+        if self.index_thread is not None:
+            self.statusBar().showMessage("Summarising the last session...")
+            self.index_thread.join()
+        self.fatigue_classifier.stop()
+        self.stats_timer.stop()
+        self.stats.close_log()
         event.accept()
@@ -0,0 +1,295 @@
+import argparse
+import os
+import sqlite3
+import time
+import numpy as np
+
+CATALOG_PATH = os.path.join("data", "catalog.sqlite")
+# The MDF trend is stored at this many points, whatever the session length
+TREND_POINTS = 120
+# Seconds a writer waits for another one to finish
+BUSY_TIMEOUT = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    id INTEGER PRIMARY KEY,
+    patient_id TEXT NOT NULL UNIQUE,
+    name TEXT,
+    age TEXT,
+    gender TEXT,
+    scan_date TEXT,
+    folder TEXT
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    patient INTEGER REFERENCES patients(id),
+    exported_path TEXT,
+    started REAL,
+    duration_s REAL,
+    sample_rate REAL,
+    channels TEXT,
+    samples INTEGER,
+    file_size INTEGER,
+    capture TEXT,
+    windows INTEGER,
+    mean_rms REAL,
+    mean_zc REAL,
+    mdf_start_hz REAL,
+    mdf_end_hz REAL,
+    mdf_slope_hz_per_min REAL,
+    fatigue_fraction REAL,
+    mdf_trend BLOB,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_patient ON sessions(patient);
+CREATE INDEX IF NOT EXISTS sessions_started ON sessions(started);
+"""
+# Columns returned by find_sessions; the trend is fetched separately
+LIST_COLUMNS = ("path", "exported_path", "started", "duration_s", "sample_rate", "channels", "samples",
+                "file_size", "capture", "windows", "mean_rms", "mean_zc", "mdf_start_hz", "mdf_end_hz",
+                "mdf_slope_hz_per_min", "fatigue_fraction", "status")
+SUMMARY_FIELDS = ("windows", "mean_rms", "mean_zc", "mdf_start_hz", "mdf_end_hz", "mdf_slope_hz_per_min",
+                  "fatigue_fraction", "status")
+
+
+def _trend(values, points=TREND_POINTS):
+    """Average ``values`` down to at most ``points`` evenly sized bins."""
+    values = np.asarray(values, dtype=float)
+    if len(values) <= points:
+        return values.astype(np.float32)
+    edges = np.linspace(0, len(values), points + 1).astype(int)
+    return (np.add.reduceat(values, edges[:-1]) / np.diff(edges)).astype(np.float32)
+
+
+def summarise_recording(path, model_error=None):
+    """Compute the catalog summary of a finished recording from its samples.
+
+    Uses the same features, windows and filtering as the batch analysis,
+    and runs the fatigue model if it can be loaded.
+    """
+    from batch_analysis import session_features, predict_session, summarise, DEFAULT_SAMPLE_RATE
+    from feature_extraction import FEATURE_NAMES
+    from csv_reader import load_recording
+
+    if model_error is None:
+        from models_load import load_rf_model
+
+        try:
+            load_rf_model()
+        except Exception as e:
+            model_error = str(e).splitlines()[0] if str(e) else type(e).__name__
+
+    samples, _, sample_rate = load_recording(path)
+    features, times = session_features(samples, sample_rate or DEFAULT_SAMPLE_RATE)
+    predictions, status = predict_session(features, model_error)
+    summary = summarise(features, times, predictions)
+    summary["status"] = status
+    mdf = features[:, :, FEATURE_NAMES.index("mdf")].mean(axis=1)
+    summary["mdf_trend"] = _trend(mdf).tobytes()
+    return summary
+
+
+class SessionCatalog:
+    """SQLite index of recorded sessions, their patients and precomputed summaries.
+
+    Listing and filtering only read the catalog, never the recordings. Each
+    call opens its own connection, so the catalog can be updated from a
+    worker thread while the GUI queries it.
+    """
+
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def _execute(self, sql, parameters=()):
+        db = self._connect()
+        try:
+            with db:
+                return db.execute(sql, parameters).lastrowid
+        finally:
+            db.close()
+
+    def add_patient(self, patient_info, folder=None):
+        """Insert or update a patient from the patient dialog's fields; returns the row id."""
+        db = self._connect()
+        try:
+            with db:
+                db.execute("INSERT INTO patients (patient_id, name, age, gender, scan_date, folder) "
+                           "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(patient_id) DO UPDATE SET "
+                           "name = excluded.name, age = excluded.age, gender = excluded.gender, "
+                           "scan_date = excluded.scan_date, folder = COALESCE(excluded.folder, folder)",
+                           (patient_info["id"], patient_info.get("name"), patient_info.get("age"),
+                            patient_info.get("gender"), patient_info.get("date"), folder))
+                return db.execute("SELECT id FROM patients WHERE patient_id = ?",
+                                  (patient_info["id"],)).fetchone()[0]
+        finally:
+            db.close()
+
+    def add_session(self, path):
+        """Catalog a recording from its header alone; the summary is added by ``update_summary``."""
+        from session_format import SessionFile, is_session_file
+
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        if is_session_file(path):
+            session = SessionFile(path)
+            sample_rate, channels, samples = session.sample_rate, session.channels, len(session)
+            started = session.header.get("start_time")
+            capture = session.header.get("capture", "continuous")
+        else:
+            # CSV recordings carry no header; count the rows without parsing them
+            with open(path, "rb") as f:
+                channels = f.readline().decode("utf-8").strip().split(",")
+                samples = sum(1 for _ in f)
+            sample_rate, started, capture = None, None, "continuous"
+        duration = samples / sample_rate if sample_rate else None
+        if started is None:
+            started = stat.st_mtime - (duration or 0)
+        self._execute("INSERT INTO sessions (path, started, duration_s, sample_rate, channels, samples, file_size, "
+                      "capture, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'pending') ON CONFLICT(path) DO UPDATE SET "
+                      "started = excluded.started, duration_s = excluded.duration_s, "
+                      "sample_rate = excluded.sample_rate, channels = excluded.channels, "
+                      "samples = excluded.samples, file_size = excluded.file_size, capture = excluded.capture",
+                      (path, started, duration, sample_rate, ",".join(channels), samples, stat.st_size, capture))
+
+    def update_summary(self, path, summary):
+        fields = [name for name in SUMMARY_FIELDS + ("mdf_trend",) if name in summary]
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._execute(f"UPDATE sessions SET {assignments} WHERE path = ?",
+                      [summary[name] for name in fields] + [os.path.abspath(path)])
+
+    def index_recording(self, path):
+        """Catalog a finished recording and compute its summary; slow, so run it off the GUI thread."""
+        self.add_session(path)
+        try:
+            summary = summarise_recording(path)
+        except Exception as e:
+            summary = {"status": f"failed: {e}"}
+        self.update_summary(path, summary)
+
+    def set_patient(self, path, patient_info, folder=None, exported_path=None):
+        """Link a cataloged recording to a patient, e.g. when it is exported."""
+        patient = self.add_patient(patient_info, folder)
+        # The summary may still be being computed; add_session fills in the rest
+        self._execute("INSERT INTO sessions (path, status) VALUES (?, 'pending') ON CONFLICT(path) DO NOTHING",
+                      (os.path.abspath(path),))
+        self._execute("UPDATE sessions SET patient = ?, exported_path = COALESCE(?, exported_path) WHERE path = ?",
+                      (patient, exported_path and os.path.abspath(exported_path), os.path.abspath(path)))
+
+    def find_sessions(self, patient=None, since=None, until=None, min_duration=None, min_fatigue=None,
+                      limit=None):
+        """Return matching sessions, newest first, as dicts with the patient's id and name.
+
+        ``patient`` matches the patient id or name; ``since`` and ``until``
+        are Unix times.
+        """
+        columns = ", ".join(f"s.{name}" for name in LIST_COLUMNS)
+        sql = (f"SELECT {columns}, p.patient_id, p.name AS patient_name FROM sessions s "
+               "LEFT JOIN patients p ON p.id = s.patient")
+        conditions, parameters = [], []
+        if patient is not None:
+            conditions.append("(p.patient_id = ? OR p.name = ?)")
+            parameters += [patient, patient]
+        if since is not None:
+            conditions.append("s.started >= ?")
+            parameters.append(since)
+        if until is not None:
+            conditions.append("s.started < ?")
+            parameters.append(until)
+        if min_duration is not None:
+            conditions.append("s.duration_s >= ?")
+            parameters.append(min_duration)
+        if min_fatigue is not None:
+            conditions.append("s.fatigue_fraction >= ?")
+            parameters.append(min_fatigue)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY s.started DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            parameters.append(limit)
+        db = self._connect()
+        try:
+            return [dict(row) for row in db.execute(sql, parameters)]
+        finally:
+            db.close()
+
+    def mdf_trend(self, path):
+        """The stored MDF trend of a session, or an empty array."""
+        db = self._connect()
+        try:
+            row = db.execute("SELECT mdf_trend FROM sessions WHERE path = ?", (os.path.abspath(path),)).fetchone()
+        finally:
+            db.close()
+        if row is None or row[0] is None:
+            return np.empty(0, dtype=np.float32)
+        return np.frombuffer(row[0], dtype=np.float32)
+
+    def prune(self):
+        """Forget sessions whose recording no longer exists; returns how many."""
+        db = self._connect()
+        try:
+            paths = [row[0] for row in db.execute("SELECT path FROM sessions")]
+            missing = [(path,) for path in paths if not os.path.exists(path)]
+            with db:
+                db.executemany("DELETE FROM sessions WHERE path = ?", missing)
+        finally:
+            db.close()
+        return len(missing)
+
+
+def main():
+    from batch_analysis import find_sessions, print_summary, DATA_FOLDER
+
+    parser = argparse.ArgumentParser(description="List and filter the recorded sessions in the catalog")
+    parser.add_argument("--catalog", default=CATALOG_PATH)
+    parser.add_argument("--scan", metavar="FOLDER", nargs="?", const=DATA_FOLDER,
+                        help="first catalog recordings under FOLDER that are not in the catalog yet")
+    parser.add_argument("--patient", help="patient id or name")
+    parser.add_argument("--days", type=float, help="only sessions started in the last DAYS days")
+    parser.add_argument("--min-duration", type=float, help="seconds")
+    parser.add_argument("--min-fatigue", type=float, help="fraction of fatigued windows")
+    parser.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    catalog = SessionCatalog(args.catalog)
+    if args.scan:
+        rows = catalog.find_sessions()
+        # Exported copies are already cataloged under their recording
+        known = {path for row in rows for path in (row["path"], row["exported_path"])}
+        new = [path for path in find_sessions(args.scan, include_recordings=True)
+               if os.path.abspath(path) not in known]
+        # Summaries cut short (e.g. the app closed mid-way) or that failed are retried
+        unfinished = [row["path"] for row in rows if os.path.exists(row["path"])
+                      and (row["status"] is None or row["status"] == "pending" or row["status"].startswith("failed"))]
+        print(f"Cataloging {len(new)} new recording(s), retrying {len(unfinished)} unfinished")
+        for path in new + unfinished:
+            catalog.index_recording(path)
+        removed = catalog.prune()
+        if removed:
+            print(f"Removed {removed} session(s) whose recording is gone")
+
+    start = time.perf_counter()
+    since = time.time() - args.days * 86400 if args.days else None
+    rows = catalog.find_sessions(args.patient, since, None, args.min_duration, args.min_fatigue, args.limit)
+    elapsed = time.perf_counter() - start
+    for row in rows:
+        row["session"] = os.path.relpath(row["path"])
+        row["duration_s"] = None if row["duration_s"] is None else round(row["duration_s"], 2)
+    if rows:
+        print_summary(rows)
+    print(f"{len(rows)} session(s) in {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+import json
+import os
+import struct
+import zlib
+import numpy as np
+
+# Session file layout:
+#   preamble  magic (8 bytes), uint32 version, uint32 data offset
+#   header    UTF-8 JSON: sample_rate, channels, dtype, patient, ...
+#             padded with spaces up to the data offset
+#   samples   raw (n_samples, n_channels) array in the header dtype
+# The data offset is a multiple of HEADER_BLOCK so the samples can be
+# memory-mapped, and the header can be rewritten in place (e.g. to add
+# patient details at export time) without moving the samples. The sample
+# count is derived from the file size, so a file can be appended to while
+# a session is still running.
+#
+# Compressed session files (version 2) have the same preamble and header,
+# with "compression" set, followed by independently compressed chunks:
+#   chunk     uint32 sample count, uint32 compressed size, compressed bytes
+#   index     int64 (first sample, file offset) per chunk
+#   trailer   index magic (8 bytes), uint64 index offset, uint64 chunk count
+# A chunk stores the samples' bit patterns delta-encoded along time, then
+# byte-shuffled so the slowly changing high bytes sit together, then zlib.
+# That is lossless, and any sample range only needs the chunks covering it.
+# The index is written when the recording is closed; a file without one
+# (still recording, or cut short) is indexed by walking the chunk headers.
+MAGIC = b"EMGSESS\0"
+VERSION = 1
+COMPRESSED_VERSION = 2
+PREAMBLE = struct.Struct("<8sII")
+HEADER_BLOCK = 4096
+EXTENSION = ".emgs"
+DEFAULT_DTYPE = "<f4"
+COMPRESSION = "delta-shuffle-zlib"
+# zlib's fastest level; the shuffle does most of the work
+COMPRESSION_LEVEL = 1
+CHUNK_HEADER = struct.Struct("<II")
+INDEX_MAGIC = b"EMGSIDX\0"
+TRAILER = struct.Struct("<8sQQ")
+
+
+def _encode_header(header, data_offset=None):
+    body = json.dumps(header).encode("utf-8")
+    needed = PREAMBLE.size + len(body)
+    if data_offset is None:
+        data_offset = -(-needed // HEADER_BLOCK) * HEADER_BLOCK
+    elif needed > data_offset:
+        raise ValueError("Header does not fit in the space reserved for it")
+    version = COMPRESSED_VERSION if header.get("compression") else VERSION
+    preamble = PREAMBLE.pack(MAGIC, version, data_offset)
+    return preamble + body + b" " * (data_offset - needed)
+
+
+def make_header(sample_rate, channels=("emg",), patient=None, dtype=DEFAULT_DTYPE, **extra):
+    header = {
+        "sample_rate": sample_rate,
+        "channels": list(channels),
+        "dtype": np.dtype(dtype).str,
+        "patient": patient or {},
+    }
+    header.update(extra)
+    return header
+
+
+def write_header(f, header):
+    """Write the preamble and header at the current position of an open binary file."""
+    f.write(_encode_header(header))
+
+
+def write_session(path, samples, sample_rate, channels=("emg",), patient=None, dtype=DEFAULT_DTYPE):
+    samples = np.asarray(samples)
+    if samples.ndim == 1:
+        samples = samples[:, np.newaxis]
+    if samples.shape[1] != len(channels):
+        raise ValueError("Sample columns do not match the channel names")
+
+    header = make_header(sample_rate, channels, patient, dtype)
+    with open(path, "wb") as f:
+        write_header(f, header)
+        f.write(np.ascontiguousarray(samples, dtype=header["dtype"]).tobytes())
+
+
+def read_header(path):
+    """Return (header, data_offset) for a session file."""
+    with open(path, "rb") as f:
+        preamble = f.read(PREAMBLE.size)
+        if len(preamble) < PREAMBLE.size:
+            raise ValueError(f"{path} is not a session file")
+        magic, version, data_offset = PREAMBLE.unpack(preamble)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a session file")
+        if version > COMPRESSED_VERSION:
+            raise ValueError(f"Unsupported session file version {version}")
+        header = json.loads(f.read(data_offset - PREAMBLE.size).decode("utf-8"))
+    return header, data_offset
+
+
+def update_header(path, **fields):
+    """Change header fields in place, keeping the samples where they are."""
+    header, data_offset = read_header(path)
+    header.update(fields)
+    with open(path, "r+b") as f:
+        f.write(_encode_header(header, data_offset))
+
+
+def _bits_dtype(dtype):
+    # Unsigned integers of the same width, for exact (wrapping) deltas
+    return np.dtype(f"<u{np.dtype(dtype).itemsize}")
+
+
+def encode_chunk(samples, dtype=DEFAULT_DTYPE):
+    """Compress an (n_samples, n_channels) block into one chunk, header included."""
+    dtype = np.dtype(dtype)
+    bits = np.ascontiguousarray(samples, dtype=dtype).view(_bits_dtype(dtype))
+    delta = bits.copy()
+    delta[1:] -= bits[:-1]
+    # Channel-major, then byte planes: every sample's byte 0, then byte 1, ...
+    planes = np.ascontiguousarray(delta.T).view(np.uint8).reshape(-1, dtype.itemsize).T
+    data = zlib.compress(planes.tobytes(), COMPRESSION_LEVEL)
+    return CHUNK_HEADER.pack(len(samples), len(data)) + data
+
+
+def decode_chunk(data, n_samples, n_channels, dtype=DEFAULT_DTYPE):
+    """Inverse of ``encode_chunk`` for the bytes after the chunk header."""
+    dtype = np.dtype(dtype)
+    planes = np.frombuffer(zlib.decompress(data), dtype=np.uint8).reshape(dtype.itemsize, -1)
+    delta = np.ascontiguousarray(planes.T).view(_bits_dtype(dtype)).reshape(n_channels, n_samples).T
+    return np.cumsum(delta, axis=0, dtype=delta.dtype).view(dtype)
+
+
+def write_index(f, index):
+    """Append the chunk index and trailer; ``index`` is a list of (first sample, file offset)."""
+    position = f.tell()
+    f.write(np.asarray(index, dtype="<i8").reshape(-1, 2).tobytes())
+    f.write(TRAILER.pack(INDEX_MAGIC, position, len(index)))
+
+
+def read_index(path, data_offset):
+    """Return (chunk starts plus the total sample count, chunk file offsets)."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        if size - data_offset >= TRAILER.size:
+            f.seek(size - TRAILER.size)
+            magic, position, count = TRAILER.unpack(f.read(TRAILER.size))
+            if magic == INDEX_MAGIC and position + 16 * count + TRAILER.size == size:
+                f.seek(position)
+                index = np.frombuffer(f.read(16 * count), dtype="<i8").reshape(-1, 2)
+                # The chunk after the last one would start where the index does
+                f.seek(index[-1, 1] if count else data_offset)
+                last = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))[0] if count else 0
+                total = int(index[-1, 0]) + last if count else 0
+                return np.append(index[:, 0], total), index[:, 1].copy()
+
+        # No index yet: walk the chunk headers, ignoring a partly written last chunk
+        starts, offsets = [0], []
+        position = data_offset
+        while position + CHUNK_HEADER.size <= size:
+            f.seek(position)
+            n_samples, length = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))
+            if position + CHUNK_HEADER.size + length > size:
+                break
+            offsets.append(position)
+            starts.append(starts[-1] + n_samples)
+            position += CHUNK_HEADER.size + length
+    return np.array(starts, dtype=np.int64), np.array(offsets, dtype=np.int64)
+
+
+class ChunkedSamples:
+    """Array-like (n_samples, n_channels) view of a compressed session file.
+
+    Slicing decompresses only the chunks the rows fall in; the last chunk
+    read is kept, so reading a file in small consecutive slices stays cheap.
+    """
+
+    def __init__(self, path, data_offset, n_channels, dtype):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.starts, self.offsets = read_index(path, data_offset)
+        self.shape = (int(self.starts[-1]), n_channels)
+        self.ndim = 2
+        self._cached = (None, None)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _chunk(self, f, number):
+        cached_number, cached = self._cached
+        if cached_number == number:
+            return cached
+        f.seek(self.offsets[number])
+        n_samples, length = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))
+        chunk = decode_chunk(f.read(length), n_samples, self.shape[1], self.dtype)
+        self._cached = (number, chunk)
+        return chunk
+
+    def read(self, start, stop):
+        """Decompress samples ``start`` to ``stop``."""
+        start, stop = max(start, 0), min(stop, len(self))
+        if stop <= start:
+            return np.empty((0, self.shape[1]), dtype=self.dtype)
+        first = int(np.searchsorted(self.starts, start, side="right")) - 1
+        last = int(np.searchsorted(self.starts, stop, side="left"))
+        with open(self.path, "rb") as f:
+            chunks = [self._chunk(f, number) for number in range(first, last)]
+        block = chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+        offset = start - self.starts[first]
+        return block[offset:offset + stop - start]
+
+    def __getitem__(self, key):
+        rows, columns = key if isinstance(key, tuple) else (key, slice(None))
+        if isinstance(rows, slice):
+            start, stop, step = rows.indices(len(self))
+            if step > 0:
+                return self.read(start, stop)[::step, columns]
+            return self.read(stop + 1, start + 1)[::step, columns]
+        if np.ndim(rows) == 0:
+            row = int(rows) + len(self) if rows < 0 else int(rows)
+            if not 0 <= row < len(self):
+                raise IndexError(f"Sample {rows} is out of range")
+            return self.read(row, row + 1)[0, columns]
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        rows = np.where(rows < 0, rows + len(self), rows)
+        if len(rows) == 0:
+            return np.empty((0, self.shape[1]), dtype=self.dtype)[:, columns]
+        low = int(rows.min())
+        return self.read(low, int(rows.max()) + 1)[rows - low][:, columns]
+
+    def __array__(self, dtype=None, copy=None):
+        samples = self.read(0, len(self))
+        return samples if dtype is None else samples.astype(dtype)
+
+
+def is_session_file(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class SessionFile:
+    """Read-only view of a session file.
+
+    Opening is cheap; ``samples`` is a numpy.memmap that is only paged in as
+    it is sliced, or a ``ChunkedSamples`` that decompresses as it is sliced.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header, self.data_offset = read_header(path)
+        self.sample_rate = self.header["sample_rate"]
+        self.channels = self.header["channels"]
+        self.patient = self.header.get("patient", {})
+        self.dtype = np.dtype(self.header["dtype"])
+
+        if self.header.get("compression"):
+            if self.header["compression"] != COMPRESSION:
+                raise ValueError(f"Unsupported compression: {self.header['compression']}")
+            self.samples = ChunkedSamples(path, self.data_offset, len(self.channels), self.dtype)
+            return
+
+        row_size = self.dtype.itemsize * len(self.channels)
+        n_samples = (os.path.getsize(path) - self.data_offset) // row_size
+        if n_samples > 0:
+            self.samples = np.memmap(path, dtype=self.dtype, mode="r", offset=self.data_offset,
+                                     shape=(n_samples, len(self.channels)))
+        else:
+            self.samples = np.empty((0, len(self.channels)), dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.samples)
+
+    @property
+    def duration(self):
+        return len(self) / self.sample_rate
+
+    def channel(self, name):
+        return self.samples[:, self.channels.index(name)]
+
+    def time_slice(self, start, stop):
+        """Samples between two times in seconds."""
+        return self.samples[int(start * self.sample_rate):int(stop * self.sample_rate)]
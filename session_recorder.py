@@ -0,0 +1,145 @@
+import os
+import queue
+import threading
+import numpy as np
+from session_format import (make_header, write_header, encode_chunk, write_index, COMPRESSION,
+                            EXTENSION as SESSION_EXTENSION)
+from utils import channel_names
+
+# Samples per chunk handed to the writer thread
+CHUNK_SIZE = 4096
+# Chunks waiting for the disk before the producer is made to wait
+MAX_QUEUED_CHUNKS = 64
+FORMATS = ("csv", "binary", "compressed")
+EXTENSIONS = {"csv": ".csv", "binary": SESSION_EXTENSION, "compressed": SESSION_EXTENSION}
+DEFAULT_SAMPLE_RATE = 1000
+# Where the app streams every session it collects; exports copy them into patient folders
+RECORDINGS_FOLDER = os.path.join("data", "recordings")
+
+
+class SessionRecorder:
+    """Streams a session to disk in fixed-size chunks on a background thread.
+
+    ``csv`` writes one row per sample with a column per channel. ``binary``
+    writes a session file (see ``session_format``) whose float32 samples are
+    appended as they arrive. ``compressed`` writes a session file of
+    independently compressed chunks, one per queued chunk, compressed on
+    the writer thread and indexed when the recording is closed. Memory use
+    is bounded by the chunk queue regardless of session length. If
+    ``channels`` is not given it is taken
+    from the first chunk; later chunks with another width are dropped.
+    ``names`` labels the columns if it matches the channel count, and
+    ``info`` adds fields to a session file header.
+    """
+
+    def __init__(self, path, file_format="csv", chunk_size=CHUNK_SIZE, sample_rate=DEFAULT_SAMPLE_RATE,
+                 channels=None, names=None, info=None):
+        if file_format not in FORMATS:
+            raise ValueError(f"Unknown recording format: {file_format}")
+
+        self.path = path
+        self.file_format = file_format
+        self.chunk_size = chunk_size
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.names = names
+        self.info = info or {}
+        self.samples_written = 0
+        self.samples_dropped = 0
+        self.error = None
+
+        self._pending = []
+        self._pending_count = 0
+        self._queue = queue.Queue(maxsize=MAX_QUEUED_CHUNKS)
+        # (first sample, file offset) of each compressed chunk
+        self._index = []
+        self.thread = None
+
+    def start(self):
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write(self, samples):
+        """Queue samples for writing; only full chunks are handed to the writer."""
+        samples = np.asarray(samples, dtype=float)
+        samples = samples.reshape(len(samples) if samples.ndim else 1, -1)
+        self._pending.append(samples)
+        self._pending_count += len(samples)
+        if self._pending_count >= self.chunk_size:
+            self._flush_pending()
+
+    def _flush_pending(self):
+        if not self._pending:
+            return
+        widths = {block.shape[1] for block in self._pending}
+        if len(widths) > 1:
+            # Channel count changed mid-chunk; hand over each width separately
+            for block in self._pending:
+                self._queue.put(block)
+            self._pending = []
+            self._pending_count = 0
+            return
+        chunk = np.concatenate(self._pending)
+        self._pending = []
+        self._pending_count = 0
+        self._queue.put(chunk)
+
+    def close(self):
+        """Write any remaining samples and wait for the writer to finish."""
+        if self.thread is None:
+            return
+        self._flush_pending()
+        self._queue.put(None)
+        self.thread.join()
+        self.thread = None
+
+    def _run(self):
+        mode = "w" if self.file_format == "csv" else "wb"
+        try:
+            with open(self.path, mode, newline="" if mode == "w" else None) as f:
+                header_written = False
+                while True:
+                    chunk = self._queue.get()
+                    if chunk is None:
+                        break
+                    if not header_written:
+                        self.channels = self.channels or chunk.shape[1]
+                        self._write_header(f)
+                        header_written = True
+                    if chunk.shape[1] != self.channels:
+                        self.samples_dropped += len(chunk)
+                        continue
+                    self._write_chunk(f, chunk)
+                    self.samples_written += len(chunk)
+                if not header_written:
+                    self.channels = self.channels or 1
+                    self._write_header(f)
+                if self.file_format == "compressed":
+                    write_index(f, self._index)
+        except OSError as e:
+            self.error = e
+            # Keep draining so producers never block on a dead writer
+            while self._queue.get() is not None:
+                pass
+
+    def _write_header(self, f):
+        names = self.names if self.names and len(self.names) == self.channels else channel_names(self.channels)
+        if self.file_format == "csv":
+            f.write(",".join(names) + "\n")
+        elif self.file_format == "compressed":
+            write_header(f, make_header(self.sample_rate, names, compression=COMPRESSION, **self.info))
+        else:
+            write_header(f, make_header(self.sample_rate, names, **self.info))
+
+    def _write_chunk(self, f, chunk):
+        if self.file_format == "csv":
+            np.savetxt(f, chunk, fmt="%.9g", delimiter=",")
+        elif self.file_format == "compressed":
+            self._index.append((self.samples_written, f.tell()))
+            f.write(encode_chunk(chunk))
+        else:
+            f.write(chunk.astype("<f4").tobytes())
+        f.flush()
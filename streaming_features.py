@@ -0,0 +1,98 @@
+import numpy as np
+from ring_buffer import RingBuffer
+
+
+class StreamingFeatures:
+    """Moving average, sliding-window RMS and zero-crossing count updated in
+    constant time per sample.
+
+    ``update`` takes a single sample or a block of shape (n, channels) and
+    returns the moving-average output for the new samples, matching
+    ``filters.moving_average_filter`` on each channel. ``rms`` and
+    ``zero_crossings`` are per-channel arrays describing the latest
+    ``window`` samples, matching ``calculate_rms`` and
+    ``calculate_zero_crossing`` on that window. All channels are processed
+    together, so the Python overhead does not grow with the channel count.
+    """
+
+    def __init__(self, window=1000, ma_window=5, channels=1):
+        if window < 1 or ma_window < 1:
+            raise ValueError("Window size must be at least 1")
+
+        self.window = window
+        self.ma_window = ma_window
+        self.channels = channels
+        self._history = RingBuffer(max(window, ma_window), channels=channels)
+        self._sum_squares = np.zeros(channels)
+        self._crossings = np.zeros(channels, dtype=int)
+        self._since_resync = 0
+
+    @property
+    def count(self):
+        return min(self._history.total_written, self.window)
+
+    @property
+    def rms(self):
+        count = self.count
+        if count == 0:
+            return np.zeros(self.channels)
+        return np.sqrt(np.maximum(self._sum_squares, 0.0) / count)
+
+    @property
+    def zero_crossings(self):
+        return self._crossings.copy()
+
+    def update(self, values):
+        block = np.asarray(values, dtype=float).reshape(-1, self.channels)
+        n = len(block)
+        if n == 0:
+            return block
+
+        total = self._history.total_written
+
+        # Moving average over the last ma_window samples, raw values until
+        # the first full window exists
+        tail = self._history.latest(self.ma_window - 1)
+        joined = np.concatenate((tail, block))
+        cumulative_sum = np.concatenate((np.zeros((1, self.channels)), np.cumsum(joined, axis=0)))
+        filtered = block.copy()
+        first_full = max(self.ma_window - 1 - total, 0)
+        if first_full < n:
+            ends = np.arange(len(tail) + first_full, len(joined)) + 1
+            filtered[first_full:] = (cumulative_sum[ends] - cumulative_sum[ends - self.ma_window]) / self.ma_window
+
+        # Samples entering and leaving the RMS / zero-crossing window
+        old_window = self._history.latest(self.window)
+        leaving = max(total + n - self.window, 0) - max(total - self.window, 0)
+        sequence = np.concatenate((old_window[:leaving + 1], block))
+        outgoing = sequence[:leaving]
+
+        if total:
+            incoming_pairs = np.concatenate((old_window[-1:], block))
+        else:
+            incoming_pairs = block
+        self._crossings += np.count_nonzero(incoming_pairs[:-1] * incoming_pairs[1:] < 0, axis=0)
+        self._crossings -= np.count_nonzero(sequence[:leaving] * sequence[1:leaving + 1] < 0, axis=0)
+        self._sum_squares += np.einsum("ij,ij->j", block, block) - np.einsum("ij,ij->j", outgoing, outgoing)
+
+        self._history.extend(block)
+
+        # Running sums drift over long sessions, so recompute them exactly
+        # once per window length; this keeps the amortised cost constant
+        self._since_resync += n
+        if self._since_resync >= self.window:
+            self._resync()
+
+        return filtered
+
+    def _resync(self):
+        current = self._history.latest(self.window)
+        self._sum_squares = np.einsum("ij,ij->j", current, current)
+        self._crossings = np.count_nonzero(current[:-1] * current[1:] < 0, axis=0)
+        self._since_resync = 0
+
+    def reset(self):
+        self._history.clear()
+        self._sum_squares = np.zeros(self.channels)
+        self._crossings = np.zeros(self.channels, dtype=int)
+        self._since_resync = 0
@@ -0,0 +1,66 @@
+import numpy as np
+from ring_buffer import RingBuffer
+from feature_extraction import spectral_frequencies
+
+SPECTRUM_WINDOW = 256
+SPECTRUM_HOP = 128
+# Columns kept for the spectrogram image (about 30 s at 1 kHz)
+SPECTROGRAM_HISTORY = 256
+# Points kept for the MDF/MNF trend (about 4 minutes at 1 kHz)
+TREND_HISTORY = 2048
+# Floor added before taking the log so silent frames stay finite
+POWER_FLOOR = 1e-12
+
+
+class StreamingSpectrum:
+    """Short-time spectrum of a live signal, updated one hop at a time.
+
+    Only samples that complete a new hop are transformed; the last
+    ``window - hop`` samples are carried over so consecutive frames overlap.
+    Power spectra are averaged over channels. ``spectrogram`` holds one row
+    of dB power per frame and ``trend`` one (MDF, MNF) row per frame.
+    """
+
+    def __init__(self, sample_rate, channels=1, window=SPECTRUM_WINDOW, hop=SPECTRUM_HOP,
+                 history=SPECTROGRAM_HISTORY, trend_history=TREND_HISTORY):
+        if hop < 1 or hop > window:
+            raise ValueError("Hop must be between 1 and the window length")
+
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.window = window
+        self.hop = hop
+        self.freqs = np.fft.rfftfreq(window, d=1.0 / sample_rate)
+        self.taper = np.hanning(window)
+        self.spectrogram = RingBuffer(history, np.float32, len(self.freqs))
+        self.trend = RingBuffer(trend_history, np.float32, 2)
+        self._pending = np.empty((0, channels))
+
+    @property
+    def frame_interval(self):
+        """Seconds between consecutive frames."""
+        return self.hop / self.sample_rate
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).reshape(-1, self.channels)
+        data = np.concatenate((self._pending, values))
+        if len(data) < self.window:
+            self._pending = data
+            return
+
+        n_frames = (len(data) - self.window) // self.hop + 1
+        # (n_frames, channels, window) view of just the new frames
+        frames = np.lib.stride_tricks.sliding_window_view(data, self.window, axis=0)[::self.hop][:n_frames]
+        centred = frames - frames.mean(axis=-1, keepdims=True)
+        power = (np.abs(np.fft.rfft(centred * self.taper, axis=-1)) ** 2).mean(axis=1)
+
+        mnf, mdf = spectral_frequencies(power, self.freqs)
+        self.spectrogram.extend(10 * np.log10(power + POWER_FLOOR))
+        self.trend.extend(np.column_stack((mdf, mnf)))
+        # Keep the samples the next frame still needs
+        self._pending = data[n_frames * self.hop:]
+
+    def reset(self):
+        self.spectrogram.clear()
+        self.trend.clear()
+        self._pending = np.empty((0, self.channels))
@@ -0,0 +1,24 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_analysis import find_sessions
+
+
+def write_recording(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write("emg\n0.1\n-0.2\n")
+
+
+def test_exported_copies_are_found_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_recording(os.path.join("data", "recordings", "session_1.csv"))
+    write_recording(os.path.join("data", "alice", "session_1.csv"))
+
+    assert find_sessions("data") == [os.path.join("data", "alice", "session_1.csv")]
+    # The catalog indexes the recordings themselves
+    assert len(find_sessions("data", include_recordings=True)) == 2
+    # Pointed at the recordings folder directly, it is not skipped
+    assert find_sessions(os.path.join("data", "recordings")) == [os.path.join("data", "recordings", "session_1.csv")]
@@ -0,0 +1,45 @@
+import sys
+import time
+import os
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from binary_protocol import encode_frame
+from serial_connection import SerialConnection
+
+
+class FakeSerial:
+    """Hands out the given chunks one read at a time, then nothing."""
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.is_open = True
+
+    def read(self, size):
+        if self.chunks:
+            return self.chunks.pop(0)
+        time.sleep(0.005)
+        return b""
+
+    def close(self):
+        self.is_open = False
+
+
+def test_binary_reader_survives_a_montage_change():
+    one = encode_frame(np.arange(10).reshape(-1, 1))
+    two = encode_frame(np.arange(20).reshape(-1, 2))
+    connection = SerialConnection()
+    connection.serial = FakeSerial([one, two, one + two])
+    connection.protocol = "binary"
+    connection.is_connected = True
+    connection.start_reading()
+
+    # Long enough for every chunk to be read and the pending samples flushed
+    time.sleep(0.3)
+    assert connection.thread.is_alive()
+    connection.close_connection()
+
+    widths = [block["emg"].shape[1] for block in connection.read_blocks()]
+    assert 1 in widths and 2 in widths
+    assert connection.channels == 2
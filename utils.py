@@ -3,9 +3,23 @@ def get_ports():
     return ports
 
 def get_baudrates():
-    baudrates = ["9600", "19200", "38400", "57600", "115200"]
+    baudrates = ["9600", "19200", "38400", "57600", "115200", "230400", "460800", "921600"]
     return baudrates
 
+def get_sample_rates():
+    sample_rates = ["500", "1000", "2000", "4000"]
+    return sample_rates
+
+def get_mains_frequencies():
+    # 0 turns the notch off
+    mains_frequencies = ["50", "60", "0"]
+    return mains_frequencies
+
+def get_protocols():
+    # Must match serial_connection.PROTOCOLS
+    protocols = ["json", "binary"]
+    return protocols
+
 def apply_dark_mode_to_pyqt(app):
     """Apply a dark theme to the PyQt application."""
     dark_style = """
@@ -38,3 +52,9 @@ def apply_dark_mode_to_plot(figure, ax):
     # Redraw the canvas to apply the new styles
     figure.canvas.draw()
 
+
+def channel_names(count):
+    """Column names for a recording; a single channel keeps the original "emg" name."""
+    if count == 1:
+        return ["emg"]
+    return [f"emg{x}" for x in range(1, count + 1)]